@@ -0,0 +1,27 @@
+# core/buckets.py
+"""
+Справочник бакетов просрочки (overdue_bucket) для фильтра списка клиентов.
+Список держится в памяти процесса и перечитывается, только когда меняется
+поколение данных DataVersion (загрузка dog могла добавить новый бакет).
+"""
+from .models import DataVersion, OverdueBucket
+
+_cache = {'generation': None, 'names': []}
+
+
+def bucket_names():
+    """Имена бакетов в порядке ранга."""
+    generation = DataVersion.current()
+    if _cache['generation'] != generation:
+        _cache['names'] = list(OverdueBucket.objects.values_list('name', flat=True))
+        _cache['generation'] = generation
+    return _cache['names']
+
+
+def register_buckets(cur, source: str) -> None:
+    """Незнакомые overdue_bucket_name из source -> справочник с рангом 0 (как прежний CASE ... ELSE 0)."""
+    cur.execute(
+        f"INSERT INTO overdue_bucket (name, rank) "
+        f"SELECT DISTINCT overdue_bucket_name, 0 FROM {source} WHERE overdue_bucket_name IS NOT NULL "
+        f"ON CONFLICT (name) DO NOTHING"
+    )
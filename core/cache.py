@@ -0,0 +1,124 @@
+# core/cache.py
+"""
+Кэш ответов для представлений, которые меняются только вместе с загрузкой
+(таблица клиентов, список бакетов, /api/clients/).
+
+Ключ: имя view + хост/путь + канонизированные GET-параметры + поколение данных
+DataVersion (растёт в транзакции публикации загрузки) — после загрузки
+старые ответы просто перестают находиться. Для view, выбирающих формат по
+заголовкам (DRF: JSON или browsable HTML по Accept), эти заголовки тоже
+входят в ключ — cached_view(..., vary=('Accept',)).
+От «толпы» на пустом ключе: пересчитывает один запрос (cache.add как
+замок), остальные ждут готовый ответ до STAMPEDE_WAIT секунд.
+Счётчики hit/miss по view — в том же кэше, см. stats() и
+python manage.py view_cache_stats.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .models import DataVersion
+
+PREFIX = 'view'
+DEFAULT_TTL = 300
+STAMPEDE_LOCK_TTL = 30     # замок живёт не дольше расчёта ответа
+STAMPEDE_WAIT = 5.0
+STAMPEDE_POLL = 0.05
+
+
+def _canonical_query(request) -> str:
+    """GET-параметры в каноническом виде: порядок ключей и повторов не важен, пустые отброшены."""
+    items = []
+    for key in sorted(request.GET):
+        values = sorted(v for v in request.GET.getlist(key) if v != '')
+        items.extend(f'{key}={v}' for v in values)
+    return '&'.join(items)
+
+
+def cache_key(name: str, request, generation: int, vary=()) -> str:
+    # хост — в ключе: DRF кладёт в ответ абсолютные ссылки next/previous
+    raw = f'{request.get_host()}{request.path}?{_canonical_query(request)}'
+    for header in vary:
+        raw += f'\n{header}: {request.headers.get(header, "")}'
+    return f'{PREFIX}:{name}:{generation}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def _count(name: str, what: str) -> None:
+    key = f'{PREFIX}:stats:{name}:{what}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:  # ключ вытеснили между add и incr
+            cache.set(key, 1, None)
+
+
+def stats(names=None) -> dict:
+    """{view: {'hit': N, 'miss': N}} — счётчики с момента очистки кэша."""
+    names = names or list(getattr(settings, 'VIEW_CACHE_TTL', {}))
+    return {
+        n: {w: cache.get(f'{PREFIX}:stats:{n}:{w}', 0) for w in ('hit', 'miss')}
+        for n in names
+    }
+
+
+# заголовки ответа, которые отдаются и из кэша
+STORED_HEADERS = ('Vary', 'Allow', 'Content-Language')
+
+
+def _store(key: str, response, ttl: int) -> None:
+    headers = {h: response[h] for h in STORED_HEADERS if response.has_header(h)}
+    cache.set(key, (response.status_code, response['Content-Type'], response.content, headers), ttl)
+
+
+def _restore(entry) -> HttpResponse:
+    status, content_type, content, *rest = entry   # записи без заголовков — до STORED_HEADERS
+    response = HttpResponse(content, status=status, content_type=content_type)
+    for header, value in (rest[0] if rest else {}).items():
+        response[header] = value
+    return response
+
+
+def cached_view(name: str, ttl: int = None, vary=()):
+    """
+    Декоратор view: GET-ответы 200 кэшируются на ttl секунд
+    (по умолчанию settings.VIEW_CACHE_TTL[name]). Заголовок X-Cache: HIT/MISS.
+    vary — заголовки запроса, от которых зависит ответ (отдельная запись на значение).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            timeout = ttl if ttl is not None else getattr(settings, 'VIEW_CACHE_TTL', {}).get(name, DEFAULT_TTL)
+            key = cache_key(name, request, DataVersion.current(), vary)
+
+            entry = cache.get(key)
+            if entry is None and not cache.add(f'{key}:lock', 1, STAMPEDE_LOCK_TTL):
+                # ответ уже считает другой запрос — ждём его, а не считаем параллельно
+                deadline = time.monotonic() + STAMPEDE_WAIT
+                while entry is None and time.monotonic() < deadline and cache.get(f'{key}:lock'):
+                    time.sleep(STAMPEDE_POLL)
+                    entry = cache.get(key)
+            if entry is not None:
+                _count(name, 'hit')
+                response = _restore(entry)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _count(name, 'miss')
+            try:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and not response.is_rendered:
+                    response.render()   # TemplateResponse / DRF Response
+                if response.status_code == 200 and not response.streaming:
+                    _store(key, response, timeout)
+            finally:
+                cache.delete(f'{key}:lock')
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,37 @@
+# core/cities.py
+"""
+Список городов для фильтра списка клиентов. Город клиента вычисляется один
+раз при загрузке (client_debt_snapshot.city, см. debt_snapshot), поэтому
+список берётся из снимка, а не из view clients_city. Держится в памяти
+процесса и перечитывается при смене поколения данных DataVersion.
+"""
+from typing import Optional
+
+from .models import ClientDebtSnapshot, DataVersion
+
+_cache = {'generation': None, 'names': []}
+
+
+def city_names():
+    """Города клиентов из снимка, по алфавиту."""
+    generation = DataVersion.current()
+    if _cache['generation'] != generation:
+        _cache['names'] = list(
+            ClientDebtSnapshot.objects.exclude(city__isnull=True).exclude(city='')
+            .order_by('city').values_list('city', flat=True).distinct()
+        )
+        _cache['generation'] = generation
+    return _cache['names']
+
+
+def selected_city(value) -> Optional[str]:
+    """
+    Город из ?city= для фильтра списка: только из city_names(); неизвестный
+    или устаревший — None (без фильтра), чтобы таблица, фасеты и выгрузка
+    по одной строке запроса считали одно и то же.
+    """
+    city = (value or '').strip()
+    if not city:
+        return None
+    cities = city_names()
+    return city if not cities or city in cities else None
@@ -0,0 +1,119 @@
+# core/client_daily.py
+"""
+Дневные агрегаты по клиенту (client_daily_income / _spend / _city /
+_category) для карточки клиента: суммы и число поступлений, списания, ATM,
+гео, траты по городам и категориям MCC — за день операции. Сводки за
+7/30/90 дней и «всё время» читают по строке на день, а не все операции
+клиента (см. client_kpis).
+
+Обновляются после публикации загрузки c / tr (ingest_spec: after_publish),
+в той же транзакции:
+  append        — агрегаты порции прибавляются к существующим строкам;
+  replace_range — строки заменённого диапазона day_part пересчитываются;
+  clear         — полный пересчёт.
+Полный пересчёт вручную: python manage.py refresh_client_daily.
+"""
+from typing import NamedTuple, Tuple
+
+from django.db import connection
+
+from .models import IngestJob
+
+ATM_PATTERN = '%ATM%'
+
+
+class Rollup(NamedTuple):
+    name: str
+    source: str               # исходная таблица загрузки
+    key: Tuple[str, ...]
+    sums: Tuple[str, ...]     # колонки, которые складываются при append
+    select: str               # агрегаты по {source}: колонки key + sums
+    params: tuple = ()
+
+
+ROLLUPS = {r.name: r for r in (
+    Rollup('client_daily_income', 'c', ('ac_client_hash', 'day', 'day_part'), ('inc_sum', 'inc_count'), """
+        SELECT c."ac.client_hash", DATE(c.c_txn_dt), c.day_part,
+               SUM(c.c_txn_rub_amt), count(*)
+        FROM {source} AS c
+        WHERE c.c_txn_rub_amt > 0 AND c."ac.client_hash" IS NOT NULL
+          AND c.c_txn_dt IS NOT NULL AND c.day_part IS NOT NULL
+        GROUP BY 1, 2, 3
+    """),
+    Rollup('client_daily_spend', 'tr', ('ac_client_hash', 'day', 'day_part'),
+           ('spend_sum', 'spend_count', 'atm_sum', 'geo_total', 'geo_with_city'), """
+        SELECT t.t_client_hash, DATE(t.t_evt_posted_dttm), t.day_part,
+               COALESCE(SUM(t.t_amt) FILTER (WHERE t.t_amt > 0), 0),
+               count(*) FILTER (WHERE t.t_amt > 0),
+               COALESCE(SUM(t.t_amt) FILTER (WHERE t.t_amt > 0 AND t.t_merchant_name ILIKE %s), 0),
+               count(*),
+               count(*) FILTER (WHERE t.t_trx_city IS NOT NULL AND t.t_trx_city NOT IN ('', '—'))
+        FROM {source} AS t
+        WHERE t.t_trx_direction = 'D' AND t.t_client_hash IS NOT NULL
+          AND t.t_evt_posted_dttm IS NOT NULL AND t.day_part IS NOT NULL
+        GROUP BY 1, 2, 3
+    """, (ATM_PATTERN,)),
+    Rollup('client_daily_city', 'tr', ('ac_client_hash', 'day', 'day_part', 'city'), ('spend_sum',), """
+        SELECT t.t_client_hash, DATE(t.t_evt_posted_dttm), t.day_part, t.t_trx_city,
+               SUM(t.t_amt)
+        FROM {source} AS t
+        WHERE t.t_trx_direction = 'D' AND t.t_amt > 0 AND t.t_client_hash IS NOT NULL
+          AND t.t_evt_posted_dttm IS NOT NULL AND t.day_part IS NOT NULL
+          AND t.t_trx_city IS NOT NULL AND t.t_trx_city NOT IN ('', '—')
+        GROUP BY 1, 2, 3, 4
+    """),
+    # категория — по справочнику MCC (core/mcc.py) в момент загрузки
+    Rollup('client_daily_category', 'tr', ('ac_client_hash', 'day', 'day_part', 'category_id'),
+           ('spend_sum', 'spend_count'), """
+        SELECT t.t_client_hash, DATE(t.t_evt_posted_dttm), t.day_part, COALESCE(m.category_id, 0),
+               SUM(t.t_amt), count(*)
+        FROM {source} AS t
+        LEFT JOIN mcc_category AS m ON m.mcc = t.t_mcc_code
+        WHERE t.t_trx_direction = 'D' AND t.t_amt > 0 AND t.t_client_hash IS NOT NULL
+          AND t.t_evt_posted_dttm IS NOT NULL AND t.day_part IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """),
+)}
+
+
+def _add(cur, rollup: Rollup, source: str) -> None:
+    """Агрегаты source прибавляются к строкам rollup (новых ключей — вставляются)."""
+    cur.execute(
+        f"INSERT INTO {rollup.name} AS r ({', '.join(rollup.key + rollup.sums)}) "
+        f"{rollup.select.format(source=source)} "
+        f"ON CONFLICT ({', '.join(rollup.key)}) DO UPDATE SET "
+        + ', '.join(f'{col} = r.{col} + EXCLUDED.{col}' for col in rollup.sums),
+        list(rollup.params),
+    )
+
+
+def refresh(cur, name: str, stage=None, lo=None, hi=None) -> None:
+    """Пересчёт одной таблицы агрегатов после публикации stage (без stage — полный)."""
+    rollup = ROLLUPS[name]
+    if stage is None or stage.mode == IngestJob.CLEAR:
+        # при подмене (clear) stage уже стал исходной таблицей
+        cur.execute(f'DELETE FROM {rollup.name}')
+        _add(cur, rollup, rollup.source)
+        return
+    if stage.mode == IngestJob.REPLACE_RANGE:
+        # все строки диапазона пришли в stage: старые агрегаты удаляются, новые считаются по stage
+        cur.execute(f'DELETE FROM {rollup.name} WHERE day_part BETWEEN %s AND %s', [lo, hi])
+    _add(cur, rollup, stage.name)
+
+
+def refresh_all() -> None:
+    with connection.cursor() as cur:
+        for name in ROLLUPS:
+            refresh(cur, name)
+
+
+# -------------------- хуки публикации загрузки (ingest_spec) --------------------
+
+def after_c_publish(cur, stage, lo=None, hi=None) -> None:
+    refresh(cur, 'client_daily_income', stage, lo, hi)
+
+
+def after_tr_publish(cur, stage, lo=None, hi=None) -> None:
+    refresh(cur, 'client_daily_spend', stage, lo, hi)
+    refresh(cur, 'client_daily_city', stage, lo, hi)
+    refresh(cur, 'client_daily_category', stage, lo, hi)
@@ -0,0 +1,115 @@
+# core/client_feed.py
+"""
+Лента операций карточки клиента: поступления (c) и операции по карте (tr)
+одним запросом UNION ALL — фильтр по направлению, сортировка по дате и
+постраничность по ключу (дата, источник, id) выполняются в Postgres,
+в Python приходит только видимая страница.
+
+Каждая ветка сама отсортирована и ограничена size + 1 строками (индексы
+c_client_txn_dt_idx / tr_client_posted_idx), внешний ORDER BY сливает их.
+Курсор — тот же непрозрачный токен, что у списка клиентов (clients_query).
+"""
+from typing import Optional
+
+from django.db import connection
+
+from .clients_query import encode_cursor, load_cursor
+from .mcc import category_of
+
+ORDERINGS = {'-date': 'DESC', 'date': 'ASC'}
+
+# источник строки в ключе сортировки: при равной дате c идёт раньше tr
+INCOME, CARD = 0, 1
+
+_INCOME_SQL = f"""
+(SELECT c.c_txn_dt AS dt, c.c_txn_rub_amt AS amount, '—' AS city,
+        COALESCE(c.pmnt_payer_name, '—') AS merchant, NULL::int AS mcc, 'C' AS direction,
+        {INCOME} AS src, c.id AS id
+ FROM c AS c
+ WHERE c."ac.client_hash" = %s AND c.c_txn_rub_amt > 0 AND c.c_txn_dt IS NOT NULL {{where}}
+ ORDER BY c.c_txn_dt {{order}}, c.id {{order}}
+ LIMIT %s)
+"""
+
+_CARD_SQL = f"""
+(SELECT t.t_evt_posted_dttm AS dt, t.t_amt AS amount, COALESCE(t.t_trx_city, '—') AS city,
+        COALESCE(t.t_merchant_name, '—') AS merchant, t.t_mcc_code AS mcc,
+        COALESCE(t.t_trx_direction, '') AS direction,
+        {CARD} AS src, t.id AS id
+ FROM tr AS t
+ WHERE t.t_client_hash = %s AND t.t_evt_posted_dttm IS NOT NULL {{where}}
+ ORDER BY t.t_evt_posted_dttm {{order}}, t.id {{order}}
+ LIMIT %s)
+"""
+
+COLUMNS = ('date', 'amount', 'city', 'merchant', 'mcc', 'direction')
+
+
+def _branch(sql: str, alias: str, dt_column: str, src: int, client, dt_from, dt_to,
+            key, order: str, limit: int, where=None, params=()):
+    """Ветка UNION ALL: условия клиента/периода/курсора подставляются в {where}."""
+    where, params = ([where] if where else []), list(params)
+    if dt_from and dt_to:
+        where.append(f'{dt_column} >= %s AND {dt_column} <= %s')
+        params += [dt_from, dt_to]
+    if key:
+        # строго после ключа курсора; отдельное условие по дате — для индекса
+        op = '<' if order == 'DESC' else '>'
+        where.append(f'{dt_column} {op}= %s AND ({dt_column}, {src}, {alias}.id) {op} (%s, %s, %s)')
+        params += [key[0], *key]
+    text = sql.format(where=''.join(f' AND {w}' for w in where), order=order)
+    return text, [str(client), *params, limit]
+
+
+def feed_page(client, dt_from=None, dt_to=None, direction: str = '', ordering: str = '-date',
+              size: int = 50, cursor: Optional[str] = None):
+    """
+    Страница ленты: (rows, next_cursor, prev_cursor). direction — 'C' / 'D' / ''
+    (все); ordering — '-date' (новые сверху) или 'date'. rows — dict с ключами
+    COLUMNS + merchant_cat / merchant_label (код и подпись категории MCC).
+    Битый/чужой cursor — InvalidCursor.
+    """
+    ordering = ordering if ordering in ORDERINGS else '-date'
+    key, backward = load_cursor(cursor, ordering, 3) if cursor else (None, False)
+    order = ORDERINGS[ordering]
+    if backward:
+        order = 'ASC' if order == 'DESC' else 'DESC'
+
+    branches, params = [], []
+    if direction != 'D':
+        sql, p = _branch(_INCOME_SQL, 'c', 'c.c_txn_dt', INCOME, client, dt_from, dt_to,
+                         key, order, size + 1)
+        branches.append(sql)
+        params += p
+    card_where = ('t.t_trx_direction = %s', [direction]) if direction in ('C', 'D') else (None, ())
+    sql, p = _branch(_CARD_SQL, 't', 't.t_evt_posted_dttm', CARD, client, dt_from, dt_to,
+                     key, order, size + 1, *card_where)
+    branches.append(sql)
+    params += p
+
+    with connection.cursor() as cur:
+        cur.execute(
+            f"SELECT * FROM ({' UNION ALL '.join(branches)}) AS feed "
+            f"ORDER BY dt {order}, src {order}, id {order} LIMIT %s",
+            [*params, size + 1],
+        )
+        fetched = cur.fetchall()
+
+    more = len(fetched) > size
+    fetched = fetched[:size]
+    if backward:
+        fetched.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, bool(cursor)
+
+    # строка: COLUMNS + src, id; ключ курсора — (дата, src, id)
+    key = lambda r: [r[0], r[-2], r[-1]]
+    rows = [dict(zip(COLUMNS, r)) for r in fetched]
+    # категория мерчанта — из справочника MCC в памяти процесса (core/mcc.py)
+    for row in rows:
+        category = category_of(row['mcc'])
+        row['merchant_cat'], row['merchant_label'] = (category.code, category.label) if category else ('', '')
+    next_cursor = encode_cursor(ordering, key(fetched[-1])) if fetched and has_next else None
+    prev_cursor = encode_cursor(ordering, key(fetched[0]), backward=True) if fetched and has_prev else None
+    return rows, next_cursor, prev_cursor
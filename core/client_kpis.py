@@ -0,0 +1,153 @@
+# core/client_kpis.py
+"""
+Сводки карточки клиента (client_detail_view) двумя запросами вместо
+полутора десятков.
+
+Всё, что считается по дням (итоги поступлений и трат, пик дня, активные
+дни и паузы, пик по дню недели, топ-город, доля операций с городом, ATM,
+траты по категориям MCC), —
+из дневных агрегатов client_daily_* (core/client_daily.py): цена
+переключения периода — число дней, а не операций. Медиана/p90, топ
+источников и мерчантов дневной гранулярностью не выражаются — они одним
+проходом по строкам c и tr за период.
+
+Период сводок — целые дни: от даты начала до даты конца включительно.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+
+from .mcc import categories
+
+# дневные агрегаты: поступления, траты, города
+_DAILY_SQL = """
+WITH inc AS (
+    SELECT day, SUM(inc_sum) AS s, SUM(inc_count) AS n
+    FROM client_daily_income WHERE ac_client_hash = %s {period}
+    GROUP BY day
+),
+spend AS (
+    SELECT day, SUM(spend_sum) AS s, SUM(spend_count) AS n, SUM(atm_sum) AS atm,
+           SUM(geo_total) AS geo_total, SUM(geo_with_city) AS geo_with_city
+    FROM client_daily_spend WHERE ac_client_hash = %s {period}
+    GROUP BY day
+)
+SELECT
+    inc_t.total, inc_t.cnt, peak.day, peak.s, days.active, days.max_gap,
+    sp.total, sp.cnt, sp.atm, sp.geo_total, sp.geo_with_city,
+    wd.dow, wd.s,
+    (SELECT city FROM client_daily_city WHERE ac_client_hash = %s {period}
+     GROUP BY city ORDER BY SUM(spend_sum) DESC LIMIT 1),
+    cats.ids, cats.sums
+FROM (SELECT SUM(s) AS total, COALESCE(SUM(n), 0) AS cnt FROM inc) AS inc_t
+CROSS JOIN (
+    SELECT count(*) AS active, COALESCE(MAX(gap), 0) AS max_gap
+    FROM (SELECT day - LAG(day) OVER (ORDER BY day) - 1 AS gap FROM inc) AS g
+) AS days
+CROSS JOIN (
+    SELECT COALESCE(SUM(s), 0) AS total, COALESCE(SUM(n), 0) AS cnt, COALESCE(SUM(atm), 0) AS atm,
+           COALESCE(SUM(geo_total), 0) AS geo_total, COALESCE(SUM(geo_with_city), 0) AS geo_with_city
+    FROM spend
+) AS sp
+LEFT JOIN (SELECT day, s FROM inc ORDER BY s DESC LIMIT 1) AS peak ON true
+LEFT JOIN (
+    SELECT EXTRACT(DOW FROM day)::int AS dow, SUM(s) AS s
+    FROM spend WHERE n > 0 GROUP BY 1 ORDER BY s DESC LIMIT 1
+) AS wd ON true
+LEFT JOIN (
+    SELECT array_agg(category_id ORDER BY s DESC) AS ids, array_agg(s ORDER BY s DESC) AS sums
+    FROM (SELECT category_id, SUM(spend_sum) AS s FROM client_daily_category
+          WHERE ac_client_hash = %s {period} GROUP BY category_id) AS cat
+) AS cats ON true
+"""
+
+# по строкам: медиана/p90 и топ источников (c, сумма > 0), топ мерчантов (tr, списания)
+_ROWS_SQL = """
+WITH inc AS (
+    SELECT c.c_txn_rub_amt AS amt, COALESCE(c.pmnt_payer_name, '—') AS source
+    FROM c AS c
+    WHERE c."ac.client_hash" = %s AND c.c_txn_rub_amt > 0 {c_period}
+),
+sources AS (
+    SELECT source, SUM(amt) AS s FROM inc GROUP BY source ORDER BY s DESC LIMIT 3
+),
+merchants AS (
+    SELECT COALESCE(t.t_merchant_name, '—') AS merchant, SUM(t.t_amt) AS s, count(*) AS ops
+    FROM tr AS t
+    WHERE t.t_client_hash = %s AND t.t_trx_direction = 'D' AND t.t_amt > 0 {tr_period}
+    GROUP BY 1 ORDER BY s DESC LIMIT %s
+)
+SELECT
+    (SELECT percentile_disc(0.5) WITHIN GROUP (ORDER BY amt) FROM inc),
+    (SELECT percentile_disc(0.9) WITHIN GROUP (ORDER BY amt) FROM inc),
+    (SELECT array_agg(source ORDER BY s DESC) FROM sources),
+    (SELECT array_agg(s ORDER BY s DESC) FROM sources),
+    (SELECT array_agg(merchant ORDER BY s DESC) FROM merchants),
+    (SELECT array_agg(s ORDER BY s DESC) FROM merchants),
+    (SELECT array_agg(ops ORDER BY s DESC) FROM merchants)
+"""
+
+
+def _days(dt_from, dt_to):
+    """Период в днях: (первый день, последний день) или (None, None) — всё время."""
+    if dt_from and dt_to:
+        return dt_from.date(), dt_to.date()
+    return None, None
+
+
+def _share(part, total) -> float:
+    return float(part) / float(total) * 100 if total else 0.0
+
+
+def client_kpis(client, dt_from=None, dt_to=None, top_limit: int = 5):
+    """
+    (поступления, траты) — два dict со сводками карточки клиента;
+    client — ac_client_hash, период [dt_from, dt_to] округляется до дней.
+    """
+    client = str(client)
+    day_from, day_to = _days(dt_from, dt_to)
+    if day_from:
+        period, period_params = 'AND day BETWEEN %s AND %s', [day_from, day_to]
+        # строки — те же целые дни: [первый день 00:00, день после последнего 00:00)
+        rows_params = [day_from, day_to + timedelta(days=1)]
+        c_period = 'AND c.c_txn_dt >= %s AND c.c_txn_dt < %s'
+        tr_period = 'AND t.t_evt_posted_dttm >= %s AND t.t_evt_posted_dttm < %s'
+    else:
+        period = c_period = tr_period = ''
+        period_params = rows_params = []
+
+    with connection.cursor() as cur:
+        cur.execute(_DAILY_SQL.format(period=period), [client, *period_params] * 4)
+        (inc_total, inc_count, peak_day, peak_amt, active, max_gap,
+         spend_total, spend_count, atm_sum, geo_total, geo_with_city,
+         dow, dow_sum, top_city, category_ids, category_sums) = cur.fetchone()
+        cur.execute(_ROWS_SQL.format(c_period=c_period, tr_period=tr_period),
+                    [client, *rows_params, client, *rows_params, top_limit])
+        median, p90, source_names, source_amounts, merchant_names, merchant_amounts, merchant_ops = cur.fetchone()
+
+    spend_total = spend_total or Decimal(0)
+    dim = categories()
+    inc = {
+        'total': inc_total, 'count': int(inc_count or 0), 'median': median, 'p90': p90,
+        'peak_day': peak_day, 'peak_amt': peak_amt,
+        'active_days': active or 0, 'max_gap_days': max_gap or 0,
+        'top_sources': [{'name': name, 'amount': amount, 'share': _share(amount, inc_total)}
+                        for name, amount in zip(source_names or [], source_amounts or [])],
+    }
+    spend = {
+        'total': spend_total, 'count': int(spend_count or 0),
+        'avg_check': float(spend_total) / int(spend_count) if spend_count else 0.0,
+        'weekday': dow, 'weekday_share': _share(dow_sum, spend_total) if dow is not None else 0.0,
+        'top_city': top_city,
+        'geo_share': _share(geo_with_city, geo_total),
+        'atm_sum': atm_sum, 'atm_share': _share(atm_sum, spend_total),
+        'top_merchants': [{'name': name, 'amount': amount or 0, 'ops': ops, 'share': _share(amount or 0, spend_total)}
+                          for name, amount, ops in zip(merchant_names or [], merchant_amounts or [],
+                                                       merchant_ops or [])],
+        # структура трат: категории по убыванию суммы, подписи — из справочника в памяти
+        'categories': [{'code': dim[cid].code, 'name': dim[cid].label,
+                        'amount': amount, 'share': _share(amount, spend_total)}
+                       for cid, amount in zip(category_ids or [], category_sums or [])],
+    }
+    return inc, spend
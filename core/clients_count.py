@@ -0,0 +1,74 @@
+# core/clients_count.py
+"""
+Счётчик «Всего» для списков клиентов.
+
+Точное число кэшируется по нормализованному набору фильтров (client_filters)
+и поколению данных DataVersion: после любой публикации загрузки ключ
+меняется, старые значения просто перестают читаться.
+Если в кэше ничего нет, а по оценке планировщика (EXPLAIN) строк больше
+CLIENTS_COUNT_EXACT_LIMIT, точный COUNT не запускается — показывается
+оценка с пометкой «≈».
+"""
+import hashlib
+import json
+import logging
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .clients_query import filtered_clients
+from .models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'clients_count'
+
+
+class Count(NamedTuple):
+    value: int
+    approximate: bool
+
+
+def _cache_key(filters: dict, generation: int) -> str:
+    raw = json.dumps(
+        {k: (format(v.normalize(), 'f') if hasattr(v, 'normalize') else v) for k, v in filters.items()},
+        sort_keys=True, default=str,
+    )
+    return f'{CACHE_PREFIX}:{generation}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def estimate(qs) -> Optional[int]:
+    """Оценка числа строк планировщиком (EXPLAIN, без выполнения); None — если недоступно."""
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = qs.order_by().query.sql_with_params()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cur.fetchone()[0]
+    except Exception:
+        logger.exception("clients count: EXPLAIN failed")
+        return None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def clients_count(filters: dict, allow_estimate: bool = True) -> Count:
+    generation = DataVersion.current()
+    key = _cache_key(filters, generation)
+    cached = cache.get(key)
+    if cached is not None:
+        return Count(cached, False)
+
+    qs = filtered_clients(filters)
+    if allow_estimate:
+        rows = estimate(qs)
+        if rows is not None and rows > settings.CLIENTS_COUNT_EXACT_LIMIT:
+            return Count(rows, True)
+
+    value = qs.count()
+    cache.set(key, value, settings.CLIENTS_COUNT_CACHE_TTL)
+    return Count(value, False)
@@ -0,0 +1,84 @@
+# core/clients_facets.py
+"""
+Счётчики для фильтров списка клиентов: число клиентов и сумма долга по
+бакету, городу, флагу NPL и корзинам долга — для текущего набора фильтров
+(client_filters). Всё считается одним проходом по снимку
+client_debt_snapshot через GROUPING SETS, а не отдельным запросом на фасет.
+Ответ кэшируется по поколению данных (cached_view в sber1/urls.py).
+"""
+from decimal import Decimal
+
+from django.db import connection
+
+from .clients_query import filtered_clients
+
+# границы корзин гистограммы долга, ₽: [0, 10к), [10к, 50к), ... [5 млн, ∞)
+DEBT_BIN_EDGES = (0, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+# width_bucket(x, массив границ): 0 — меньше первой границы, i — [edges[i-1], edges[i])
+_FACETS_SQL = """
+WITH f AS ({filtered}),
+b AS (
+    SELECT overdue_bucket_name, bucket_rank, city, npl_nflag, debt_tot_os_rub_amt,
+           width_bucket(debt_tot_os_rub_amt, %s::numeric[]) AS debt_bin
+    FROM f
+)
+SELECT GROUPING(overdue_bucket_name, bucket_rank) AS g_bucket,
+       GROUPING(city) AS g_city,
+       GROUPING(npl_nflag) AS g_npl,
+       GROUPING(debt_bin) AS g_bin,
+       overdue_bucket_name, bucket_rank, city, npl_nflag, debt_bin,
+       count(*), COALESCE(sum(debt_tot_os_rub_amt), 0)
+FROM b
+GROUP BY GROUPING SETS ((overdue_bucket_name, bucket_rank), (city), (npl_nflag), (debt_bin), ())
+"""
+
+
+def _bin(index):
+    """Границы корзины по номеру из width_bucket (None — долг не указан)."""
+    if index is None:
+        return None, None
+    lo = DEBT_BIN_EDGES[index - 1] if index > 0 else None
+    hi = DEBT_BIN_EDGES[index] if index < len(DEBT_BIN_EDGES) else None
+    return lo, hi
+
+
+def _item(**fields):
+    clients, debt = fields.pop('clients'), fields.pop('debt')
+    return {**fields, 'clients': clients, 'debt': Decimal(debt)}
+
+
+def client_facets(filters: dict) -> dict:
+    """
+    {'total': {clients, debt}, 'buckets': [...], 'cities': [...], 'npl': [...],
+     'debt_bins': [...]} для набора фильтров; бакеты — в порядке ранга,
+    города — по алфавиту, корзины — по возрастанию долга.
+    """
+    columns = ('overdue_bucket_name', 'bucket_rank', 'city', 'npl_nflag', 'debt_tot_os_rub_amt')
+    sql, params = filtered_clients(filters).order_by().values(*columns).query.sql_with_params()
+    with connection.cursor() as cur:
+        cur.execute(_FACETS_SQL.format(filtered=sql), [*params, list(DEBT_BIN_EDGES)])
+        rows = cur.fetchall()
+
+    result = {'total': {'clients': 0, 'debt': Decimal(0)}, 'buckets': [], 'cities': [], 'npl': [], 'debt_bins': []}
+    for g_bucket, g_city, g_npl, g_bin, bucket, rank, city, npl, debt_bin, clients, debt in rows:
+        if not g_bucket:
+            result['buckets'].append((rank, _item(name=bucket, clients=clients, debt=debt)))
+        elif not g_city:
+            result['cities'].append(_item(name=city, clients=clients, debt=debt))
+        elif not g_npl:
+            result['npl'].append(_item(value=npl, clients=clients, debt=debt))
+        elif not g_bin:
+            lo, hi = _bin(debt_bin)
+            result['debt_bins'].append((debt_bin, _item(min=lo, max=hi, clients=clients, debt=debt)))
+        else:
+            result['total'] = _item(clients=clients, debt=debt)
+
+    # NULL (город/бакет/долг не указан) — в конце
+    result['buckets'] = [item for _, item in sorted(result['buckets'],
+                                                    key=lambda r: (r[1]['name'] is None, r[0], r[1]['name'] or ''))]
+    result['cities'].sort(key=lambda r: (r['name'] is None, r['name'] or ''))
+    result['npl'].sort(key=lambda r: (r['value'] is None, bool(r['value'])))
+    result['debt_bins'] = [item for _, item in sorted(result['debt_bins'],
+                                                      key=lambda r: (r[0] is None, r[0] or 0))]
+    return result
@@ -0,0 +1,185 @@
+# core/clients_query.py
+"""
+Запрос списков клиентов (clients_table_view, ClientsListAPI) по снимку
+client_debt_snapshot: фильтры, сортировки и постраничность в одном месте.
+
+Страницы — по ключу (поле сортировки, dog_id) вместо OFFSET: следующая
+страница начинается строго после последней строки предыдущей, поэтому
+глубина страницы не влияет на время запроса. Курсор next/prev — непрозрачный
+токен (base64 от JSON). NULL в сортировке считается «больше всех», как в
+Postgres по умолчанию (ASC NULLS LAST / DESC NULLS FIRST) — так ORDER BY
+совпадает с индексами snapshot_debt_idx / snapshot_rank_idx при обходе
+в обе стороны.
+"""
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+from django.db.models import F, Q, QuerySet
+
+from .models import ClientDebtSnapshot
+
+# сортировка -> поля ORDER BY (последнее — уникальный dog_id для стабильности);
+# bucket_rank — колонка снимка из справочника overdue_bucket (индекс snapshot_rank_idx)
+ORDERINGS = {
+    'overdue_desc': ('-bucket_rank', '-dog_id'),
+    'overdue_asc': ('bucket_rank', 'dog_id'),
+    'total_debt': ('debt_tot_os_rub_amt', 'dog_id'),
+    '-total_debt': ('-debt_tot_os_rub_amt', '-dog_id'),
+}
+
+
+def _decimal(value) -> Optional[Decimal]:
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value).replace(' ', '').replace(',', '.'))
+    except InvalidOperation:
+        return None
+
+
+def client_filters(params, city: Optional[str] = None) -> dict:
+    """
+    Нормализованный набор фильтров debt_min / debt_max / bucket (список) / город:
+    одинаковые по смыслу запросы дают одинаковый dict (ключ кэша счётчиков).
+    """
+    return {
+        'debt_min': _decimal(params.get('debt_min')),
+        'debt_max': _decimal(params.get('debt_max')),
+        'buckets': tuple(sorted(set(params.getlist('bucket')))),
+        'city': city or None,
+    }
+
+
+def filtered_clients(filters: dict) -> QuerySet:
+    qs = ClientDebtSnapshot.objects.all()
+    if filters['debt_min'] is not None:
+        qs = qs.filter(debt_tot_os_rub_amt__gte=filters['debt_min'])
+    if filters['debt_max'] is not None:
+        qs = qs.filter(debt_tot_os_rub_amt__lte=filters['debt_max'])
+    if filters['buckets']:
+        qs = qs.filter(overdue_bucket_name__in=filters['buckets'])
+    if filters['city']:
+        qs = qs.filter(city=filters['city'])
+    return qs
+
+
+# колонки сортировки, в которых бывает NULL
+NULLABLE = {'debt_tot_os_rub_amt'}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _fields(ordering: str):
+    """[(поле, desc)] для сортировки."""
+    return [(f.lstrip('-'), f.startswith('-')) for f in ORDERINGS[ordering]]
+
+
+def _order_by(fields, backward: bool = False):
+    out = []
+    for name, desc in fields:
+        if desc != backward:
+            out.append(F(name).desc(nulls_first=True))
+        else:
+            out.append(F(name).asc(nulls_last=True))
+    return out
+
+
+def _beyond(name: str, value, desc: bool) -> Optional[Q]:
+    """Строки строго дальше value по одному полю (NULL — больше всех); None — таких нет."""
+    if value is None:
+        return Q(**{f'{name}__isnull': False}) if desc else None
+    q = Q(**{f'{name}__lt' if desc else f'{name}__gt': value})
+    if name in NULLABLE and not desc:
+        q |= Q(**{f'{name}__isnull': True})
+    return q
+
+
+def _after(fields, values, backward: bool) -> Optional[Q]:
+    """(k1, k2) > (v1, v2) в порядке сортировки, раскрытое в OR — с учётом NULL и направлений."""
+    terms, prefix = [], Q()
+    for (name, desc), value in zip(fields, values):
+        step = _beyond(name, value, desc != backward)
+        if step is not None:
+            terms.append(prefix & step)
+        prefix &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+    if not terms:
+        return None
+    cond = terms[0]
+    for t in terms[1:]:
+        cond |= t
+    return cond
+
+
+def _key(row, fields):
+    return [getattr(row, name) for name, _ in fields]
+
+
+def encode_cursor(ordering: str, values, backward: bool = False) -> str:
+    raw = json.dumps({'o': ordering, 'k': values, 'b': int(backward)}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def load_cursor(token: str, ordering: str, size: int):
+    """-> (значения ключа из size полей, backward). Чужой/битый токен — InvalidCursor."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values, backward = list(data['k']), bool(data.get('b'))
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor('некорректный курсор') from e
+    if data.get('o') != ordering or len(values) != size:
+        raise InvalidCursor('курсор от другой сортировки')
+    return values, backward
+
+
+def decode_cursor(token: str, ordering: str):
+    return load_cursor(token, ordering, len(ORDERINGS[ordering]))
+
+
+def ordering_or_default(ordering: Optional[str], default: str = 'overdue_desc') -> str:
+    return ordering if ordering in ORDERINGS else default
+
+
+def order_clients(qs: QuerySet, ordering: str, default: str = 'overdue_desc') -> QuerySet:
+    fields = _fields(ordering_or_default(ordering, default))
+    return qs.order_by(*_order_by(fields))
+
+
+def page_clients(qs: QuerySet, ordering: str, size: int, cursor: Optional[str] = None,
+                 offset: int = 0, columns=None):
+    """
+    Одна страница списка. cursor — токен из предыдущего ответа; без него —
+    с начала либо (совместимость с ?page=) со смещения offset.
+    columns — вместо моделей выбрать кортежи (values_list) с этими полями;
+    поля сортировки, которых в columns нет, добавляются в конец кортежа.
+    Возвращает (rows, next_cursor, prev_cursor); cursor — None, если страницы нет.
+    """
+    fields = _fields(ordering)
+    backward = False
+    if cursor:
+        values, backward = decode_cursor(cursor, ordering)
+        cond = _after(fields, values, backward)
+        qs = qs.filter(cond) if cond is not None else qs.none()
+        offset = 0
+    key = lambda row: _key(row, fields)
+    if columns:
+        selected = list(columns) + [name for name, _ in fields if name not in columns]
+        positions = [selected.index(name) for name, _ in fields]
+        qs = qs.values_list(*selected)
+        key = lambda row: [row[i] for i in positions]
+
+    rows = list(qs.order_by(*_order_by(fields, backward))[offset:offset + size + 1])
+    more = len(rows) > size
+    rows = rows[:size]
+    if backward:
+        rows.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, bool(cursor) or offset > 0
+
+    next_cursor = encode_cursor(ordering, key(rows[-1])) if rows and has_next else None
+    prev_cursor = encode_cursor(ordering, key(rows[0]), backward=True) if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,83 @@
+# core/db_indexes.py
+"""
+Индексы под «горячие» запросы для таблиц, которыми Django не управляет
+(managed = False: cs, c, tr, so, core_dog). Миграции их не создают —
+объявляем здесь, создаём и проверяем командой ensure_indexes.
+
+Полная замена таблицы при загрузке (ingest_stage, clear) повторяет все
+индексы целевой таблицы, так что созданное здесь переживает подмену.
+"""
+from typing import List, NamedTuple, Optional
+
+from .ingest_copy import quote_ident
+
+
+class Index(NamedTuple):
+    name: str
+    table: str
+    columns: str   # SQL-список колонок, как в CREATE INDEX
+    used_by: str
+
+
+INDEXES: List[Index] = [
+    Index('core_dog_client_debt_idx', 'core_dog', 'ac_client_hash, debt_tot_os_rub_amt DESC, id DESC',
+          'debt_snapshot: лучшая запись клиента (DISTINCT ON)'),
+    Index('tr_client_posted_idx', 'tr', 't_client_hash, t_evt_posted_dttm',
+          'client_detail_view: операции, мерчанты, гео, ATM'),
+    Index('c_client_txn_dt_idx', 'c', '"ac.client_hash", c_txn_dt',
+          'client_detail_view: поступления и сводки'),
+    Index('so_client_oper_idx', 'so', '"ac.client_hash", date_time_oper',
+          'client_detail_view: сопоставление So ↔ C'),
+    Index('cs_client_event_dt_idx', 'cs', '"ac.client_hash", eventaction, dt',
+          'HeatmapAPI, HomeWorkAPI, geo_features.load_events_qs'),
+]
+
+# таблицы, по которым горячие запросы не должны идти полным сканированием
+HOT_TABLES = frozenset(ix.table for ix in INDEXES)
+
+
+def create_sql(ix: Index, concurrently: bool = True) -> str:
+    how = 'CONCURRENTLY ' if concurrently else ''
+    return f'CREATE INDEX {how}IF NOT EXISTS {quote_ident(ix.name)} ON {ix.table} ({ix.columns})'
+
+
+def state(cur, ix: Index) -> str:
+    """'ok' | 'missing' | 'invalid' (недостроен CONCURRENTLY) | 'no table'."""
+    cur.execute("SELECT to_regclass(%s)", [ix.table])
+    if cur.fetchone()[0] is None:
+        return 'no table'
+    cur.execute(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = %s::regclass AND c.relname = %s",
+        [ix.table, ix.name],
+    )
+    row = cur.fetchone()
+    if row is None:
+        return 'missing'
+    return 'ok' if row[0] else 'invalid'
+
+
+def ensure(cur, ix: Index, concurrently: bool = True) -> Optional[str]:
+    """
+    Создаёт индекс, если его нет; невалидный (упавший CONCURRENTLY) пересоздаёт.
+    CONCURRENTLY не работает внутри транзакции — вызывать в autocommit.
+    Возвращает выполненное действие или None.
+    """
+    current = state(cur, ix)
+    if current in ('ok', 'no table'):
+        return None
+    how = 'CONCURRENTLY ' if concurrently else ''
+    if current == 'invalid':
+        cur.execute(f'DROP INDEX {how}IF EXISTS {quote_ident(ix.name)}')
+    cur.execute(create_sql(ix, concurrently))
+    return 'recreated' if current == 'invalid' else 'created'
+
+
+def seq_scans(plan: dict, tables=HOT_TABLES) -> List[str]:
+    """Таблицы из tables, которые план (EXPLAIN FORMAT JSON) читает Seq Scan."""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in tables:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        found.extend(seq_scans(child, tables))
+    return found
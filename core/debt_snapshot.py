@@ -0,0 +1,132 @@
+# core/debt_snapshot.py
+"""
+Снимок client_debt_snapshot: одна строка на клиента — запись core_dog с
+наибольшим долгом (как раньше ROW_NUMBER()/DISTINCT ON в списках) + город
+и ранг бакета из справочника overdue_bucket.
+
+Списки клиентов (clients_table_view, ClientsListAPI) читают только снимок.
+Обновление — после публикации загрузки dog (в той же транзакции, см.
+ingest_spec: after_publish), пересчитываются только затронутые клиенты.
+Полный пересчёт: python manage.py refresh_debt_snapshot.
+"""
+from django.db import connection
+
+from .buckets import register_buckets
+from .models import IngestJob
+
+SNAPSHOT = 'client_debt_snapshot'
+CITY_VIEW = 'cber_schema.clients_city'
+
+_UPSERT_SQL = """
+INSERT INTO {snapshot} AS s
+    (ac_client_hash, dog_id, debt_tot_os_rub_amt, overdue_bucket_name, npl_nflag, bucket_rank,
+     city, day_part, refreshed_at)
+SELECT DISTINCT ON (dog.ac_client_hash)
+    dog.ac_client_hash, dog.id, dog.debt_tot_os_rub_amt, dog.overdue_bucket_name, dog.npl_nflag,
+    COALESCE(ob.rank, 0), {city}, dog.day_part, now()
+FROM core_dog AS dog
+LEFT JOIN overdue_bucket AS ob ON ob.name = dog.overdue_bucket_name
+WHERE dog.ac_client_hash IS NOT NULL {scope}
+ORDER BY dog.ac_client_hash, dog.debt_tot_os_rub_amt DESC, dog.id DESC
+ON CONFLICT (ac_client_hash) DO UPDATE SET
+    dog_id = EXCLUDED.dog_id,
+    debt_tot_os_rub_amt = EXCLUDED.debt_tot_os_rub_amt,
+    overdue_bucket_name = EXCLUDED.overdue_bucket_name,
+    npl_nflag = EXCLUDED.npl_nflag,
+    bucket_rank = EXCLUDED.bucket_rank,
+    city = EXCLUDED.city,
+    day_part = EXCLUDED.day_part,
+    refreshed_at = EXCLUDED.refreshed_at
+WHERE (s.dog_id, s.debt_tot_os_rub_amt, s.overdue_bucket_name, s.npl_nflag, s.bucket_rank, s.city, s.day_part)
+      IS DISTINCT FROM
+      (EXCLUDED.dog_id, EXCLUDED.debt_tot_os_rub_amt, EXCLUDED.overdue_bucket_name,
+       EXCLUDED.npl_nflag, EXCLUDED.bucket_rank, EXCLUDED.city, EXCLUDED.day_part)
+"""
+
+_DELETE_SQL = """
+DELETE FROM {snapshot} AS s
+WHERE NOT EXISTS (SELECT 1 FROM core_dog AS dog WHERE dog.ac_client_hash = s.ac_client_hash) {scope}
+"""
+
+# город клиента — как в прежнем списке: первый по алфавиту из clients_city
+_CITY_SQL = (f"(SELECT cc.city FROM {CITY_VIEW} AS cc "
+             f"WHERE cc.ac_client_hash = {{alias}}.ac_client_hash ORDER BY cc.city LIMIT 1)")
+
+
+def _has_city_view(cur) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", [CITY_VIEW])
+    return cur.fetchone()[0]
+
+
+def refresh(cur, clients_sql: str = None, params=()) -> None:
+    """
+    Пересчитывает снимок. clients_sql — подзапрос с колонкой ac_client_hash
+    (затронутые клиенты); без него — полный пересчёт.
+    """
+    city = _CITY_SQL.format(alias='dog') if _has_city_view(cur) else 'NULL'
+    if clients_sql:
+        scope_dog = f'AND dog.ac_client_hash IN ({clients_sql})'
+        scope_snap = f'AND s.ac_client_hash IN ({clients_sql})'
+        params = list(params)
+    else:
+        scope_dog = scope_snap = ''
+        params = []
+    cur.execute(_DELETE_SQL.format(snapshot=SNAPSHOT, scope=scope_snap), params)
+    cur.execute(_UPSERT_SQL.format(snapshot=SNAPSHOT, city=city, scope=scope_dog), params)
+
+
+def refresh_cities(cur, clients_sql: str = None, params=()) -> None:
+    """Обновляет только город (clients_city — view, меняется вместе с гео/транзакциями)."""
+    if not _has_city_view(cur):
+        return
+    scope = f'AND s.ac_client_hash IN ({clients_sql})' if clients_sql else ''
+    city = _CITY_SQL.format(alias='s')
+    cur.execute(
+        f"UPDATE {SNAPSHOT} AS s SET city = {city}, refreshed_at = now() "
+        f"WHERE s.city IS DISTINCT FROM {city} {scope}",
+        list(params) if clients_sql else [],
+    )
+
+
+# -------------------- хуки публикации загрузки (ingest_spec) --------------------
+
+def after_dog_publish(cur, stage, lo=None, hi=None) -> None:
+    """
+    dog: clear -> полный пересчёт; append -> клиенты из загрузки;
+    replace_range -> клиенты из загрузки + те, чья лучшая запись была в
+    заменённом диапазоне day_part (её могли удалить).
+    Новые бакеты из загрузки попадают в справочник overdue_bucket.
+    """
+    # при подмене таблицы (clear) stage уже стал core_dog
+    register_buckets(cur, 'core_dog' if stage.mode == IngestJob.CLEAR else stage.name)
+    if stage.mode == IngestJob.CLEAR:
+        refresh(cur)
+    elif stage.mode == IngestJob.REPLACE_RANGE:
+        refresh(cur, f"SELECT ac_client_hash FROM {stage.name} "
+                     f"UNION SELECT ac_client_hash FROM {SNAPSHOT} WHERE day_part BETWEEN %s AND %s",
+                [lo, hi])
+    else:
+        refresh(cur, f"SELECT ac_client_hash FROM {stage.name}")
+
+
+# колонка хэша клиента в источниках города (cs, tr)
+_CITY_SOURCE_CLIENT = {'cs': 'ac.client_hash', 'tr': 't_client_hash'}
+
+
+def after_city_source_publish(cur, stage, lo=None, hi=None) -> None:
+    """
+    cs / tr: город меняется только у клиентов из загрузки — их и
+    обновляем (clear — все). Хэш в источниках текстовый, в снимке bigint:
+    нечисловые хэши в снимок не попадают, их пропускаем.
+    """
+    if stage.mode == IngestJob.CLEAR:
+        refresh_cities(cur)
+        return
+    column = _CITY_SOURCE_CLIENT[stage.key]
+    refresh_cities(cur, f'SELECT h::bigint FROM (SELECT DISTINCT "{column}"::text AS h FROM {stage.name}) AS x '
+                        f"WHERE h ~ '^-?[0-9]{{1,18}}$'")
+
+
+def refresh_all() -> None:
+    with connection.cursor() as cur:
+        refresh(cur)
@@ -0,0 +1,319 @@
+# core/ingest.py
+"""
+Пайплайн загрузки датасетов: потоковое чтение порциями (xlsx/csv/parquet/ndjson)
+-> нормализация -> COPY в staging -> публикация одной транзакцией.
+
+Используется фоновым обработчиком очереди (IngestJob, команда ingest_worker).
+Сообщения совпадают с теми, что раньше формировал upload_multi_page.
+"""
+import logging
+import os
+import shutil
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .ingest_copy import copy_frame, rate_text
+from .ingest_readers import iter_chunks
+from .ingest_stage import Stage
+from .ingest_spec import DATASETS
+from .models import IngestJob
+
+logger = logging.getLogger(__name__)
+
+# Порядок важен: в нём же формируются сообщения (cs, c, tr, so, dog — как в ingest_spec)
+DATASET_KEYS = tuple(DATASETS)
+
+# report(key, **поля) — колбэк прогресса: parsed, inserted, rejected, elapsed, state
+Report = Callable[..., None]
+
+
+def _noop_report(key, **fields):
+    pass
+
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.dropna(how='all')
+    df.columns = [str(c).strip().replace('.', '_') for c in df.columns]
+    return df
+
+
+def _part_range(lo, hi, values: pd.Series):
+    """Расширяет [lo, hi] значениями колонки партиции текущей порции."""
+    values = values.dropna()
+    if not len(values):
+        return lo, hi
+    vmin, vmax = values.min().date(), values.max().date()
+    return (vmin if lo is None else min(lo, vmin)), (vmax if hi is None else max(hi, vmax))
+
+
+def ingest_dataset(key: str, source, report: Report = _noop_report,
+                   chunk_size: Optional[int] = None, mode: str = IngestJob.APPEND) -> List[str]:
+    """
+    Загружает один датасет из source (путь или файловый объект) порциями.
+    Каждая порция нормализуется и заливается COPY в staging-таблицу
+    (см. ingest_stage), целевая таблица меняется одной короткой транзакцией
+    в конце — читатели не видят частично загруженных данных.
+
+    append: ошибка одной порции её пропускает, остальные публикуются.
+    replace_range: попутно считается min/max колонки партиции
+    (day_part/date_part), публикация — DELETE диапазона + INSERT.
+    clear: полная замена таблицы (подмена через rename).
+    В replace_range/clear любая ошибка — целевая таблица не меняется.
+    Возвращает сообщения для пользователя.
+    """
+    spec = DATASETS[key]
+    label = spec['label']
+    strict = mode in (IngestJob.REPLACE_RANGE, IngestJob.CLEAR)
+    stage = Stage(key, spec['table'], mode, spec['part_column'], spec.get('after_publish'))
+    started = time.monotonic()
+    messages = []
+    parsed = inserted = bad = 0
+    copy_secs = 0.0
+    chunks = failed_chunks = 0
+    first_error = None
+    lo = hi = None
+
+    def elapsed():
+        return round(time.monotonic() - started, 3)
+
+    report(key, state='reading', parsed=0, inserted=0, rejected=0, elapsed=0)
+    try:
+        for chunk in iter_chunks(source, chunk_size):
+            df = prepare_frame(chunk)
+            if not len(df.index):
+                continue
+            chunks += 1
+            parsed += len(df.index)
+            out, chunk_bad = spec['normalize'](df)
+            bad += chunk_bad
+            if len(out):
+                try:
+                    with transaction.atomic(), connection.cursor() as cur:
+                        if not stage.ready:
+                            stage.create(cur, out.columns)
+                        n, secs = copy_frame(cur, stage.name, out)
+                    inserted += n
+                    copy_secs += secs
+                    if spec['part_column'] in out.columns:
+                        lo, hi = _part_range(lo, hi, out[spec['part_column']])
+                except Exception as e:
+                    failed_chunks += 1
+                    first_error = first_error or e
+                    logger.warning("%s: chunk %s failed: %s", label, chunks, e)
+                    if strict:
+                        break
+            report(key, state='loading', parsed=parsed, inserted=inserted, rejected=bad, elapsed=elapsed())
+    except Exception as e:
+        name = os.path.basename(str(getattr(source, 'name', source) or '<file>'))
+        messages.append(f"Ошибка чтения {name}: {e}")
+        if not chunks or strict:
+            if spec['unread_msg']:
+                messages.append(spec['unread_msg'])
+            stage.discard()
+            report(key, state='failed', elapsed=elapsed())
+            return messages
+
+    if failed_chunks and (strict or not inserted):
+        messages.append(f"{label}: ошибка вставки (COPY): {first_error}")
+        if strict:
+            messages.append(f"{label}: данные в таблице не изменены")
+        stage.discard()
+        report(key, state='failed', elapsed=elapsed())
+        return messages
+
+    if not inserted:
+        if spec['empty_msg']:
+            messages.append(spec['empty_msg'])
+        stage.discard()
+        report(key, state='done', parsed=parsed, rejected=bad, elapsed=elapsed())
+        return messages
+
+    try:
+        if mode == IngestJob.REPLACE_RANGE and lo is None:
+            raise ValueError(f"в файле нет значений {spec['part_column']}, диапазон для замены не определён")
+        report(key, state='publishing', elapsed=elapsed())
+        published = stage.publish(lo, hi)
+    except Exception as e:
+        logger.exception("%s: publish failed", label)
+        stage.discard()
+        messages.append(f"{label}: публикация не выполнена: {e}; данные в таблице не изменены")
+        report(key, state='failed', elapsed=elapsed())
+        return messages
+
+    rate = rate_text(inserted, copy_secs)
+    if mode == IngestJob.REPLACE_RANGE:
+        msg = (f"{label}: {spec['part_column']} {lo:%Y-%m-%d}…{hi:%Y-%m-%d} заменён — "
+               f"удалено {published['deleted']}, добавлено {inserted} (COPY, {rate})")
+    elif mode == IngestJob.CLEAR:
+        how = 'подмена таблицы' if published['swapped'] else 'DELETE + INSERT'
+        msg = (f"{label}: таблица заменена ({how}) — было {published['deleted']}, "
+               f"добавлено {inserted} (COPY, {rate})")
+    else:
+        msg = f"{label}: добавлено {inserted} (COPY, {rate})"
+    if bad and spec['bad_msg']:
+        msg += ", " + spec['bad_msg'].format(n=bad)
+    messages.append(msg)
+    if failed_chunks:
+        messages.append(
+            f"{label}: ошибка вставки (COPY) в {failed_chunks} из {chunks} пакетов: {first_error}"
+        )
+    report(key, state='done', parsed=parsed, inserted=inserted, rejected=bad, elapsed=elapsed())
+    return messages
+
+
+class JobReporter:
+    """Колбэк прогресса для IngestJob; picklable, поэтому годится для процессов пула."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+
+    def __call__(self, key, **fields):
+        IngestJob(pk=self.job_id).update_progress(key, fields)
+
+
+def _init_pool_worker():
+    # forkserver/spawn: поднимаем Django; fork: просто не трогаем чужие соединения
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _ingest_in_worker(key, source, report, mode):
+    try:
+        return ingest_dataset(key, source, report, mode=mode)
+    finally:
+        connections.close_all()
+
+
+def parallel_workers() -> int:
+    return max(1, int(getattr(settings, 'INGEST_PARALLEL', len(DATASET_KEYS)) or 1))
+
+
+def run_ingest(files: Dict[str, object], clear: bool = False,
+               report: Report = _noop_report, mode: Optional[str] = None) -> List[str]:
+    """
+    Полный прогон по пришедшим датасетам в режиме mode (append / clear /
+    replace_range; clear=True — старый флаг, то же что mode='clear').
+    Таблицы друг от друга не зависят, поэтому при нескольких файлах каждый
+    датасет идёт в своём процессе (своё соединение с БД). Сообщения
+    собираются в исходном порядке cs, c, tr, so, dog.
+    """
+    mode = mode or (IngestJob.CLEAR if clear else IngestJob.APPEND)
+    keys = [k for k in DATASET_KEYS if files.get(k)]
+    messages = []
+
+    workers = min(len(keys), parallel_workers())
+    if workers <= 1 or not all(isinstance(files[k], (str, os.PathLike)) for k in keys):
+        for key in keys:
+            messages.extend(ingest_dataset(key, files[key], report, mode=mode))
+        return messages
+
+    # соединение родителя не должно достаться дочерним процессам
+    connections.close_all()
+    results: Dict[str, List[str]] = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker) as pool:
+        futures = {pool.submit(_ingest_in_worker, key, files[key], report, mode): key for key in keys}
+        for fut in as_completed(futures):
+            key = futures[fut]
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                logger.exception("%s: worker failed", key)
+                results[key] = [f"{DATASETS[key]['label']}: ошибка загрузки: {e}"]
+                report(key, state='failed')
+    for key in keys:
+        messages.extend(results.get(key, []))
+    return messages
+
+
+# -------------------- Очередь фоновых загрузок --------------------
+
+def claim_next_job():
+    """Берёт следующую задачу из очереди (FOR UPDATE SKIP LOCKED) или None."""
+    with transaction.atomic():
+        job = (IngestJob.objects.select_for_update(skip_locked=True)
+               .filter(status=IngestJob.QUEUED).order_by('id').first())
+        if job is None:
+            return None
+        job.status = IngestJob.RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.worker_pid = os.getpid()
+        job.worker_host = socket.gethostname()
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'worker_pid', 'worker_host'])
+    return job
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # процесс есть, но чужой
+    return True
+
+
+def reap_stale_jobs() -> int:
+    """
+    Задачи running, которые уже никто не выполнит (обработчик убит — SIGKILL,
+    OOM, деплой), -> failed, чтобы страница прогресса не опрашивала их
+    вечно. Зависшей считается задача, у которой процесс worker_pid на этом
+    хосте не существует, или от обработчика которой (в т.ч. на другом хосте)
+    дольше INGEST_JOB_TIMEOUT не было отметок прогресса (heartbeat_at) —
+    длинная, но идущая загрузка отчитывается по каждой порции и не трогается.
+    Повторно в очередь не ставим: часть датасетов могла успеть
+    опубликоваться, а append дописал бы их ещё раз. Файлы остаются для
+    разбора, как при любой ошибке. Возвращает число помеченных задач.
+    """
+    timeout = int(getattr(settings, 'INGEST_JOB_TIMEOUT', 3600))
+    host = socket.gethostname()
+    now = timezone.now()
+    reaped = 0
+    with transaction.atomic():
+        running = IngestJob.objects.select_for_update(skip_locked=True).filter(status=IngestJob.RUNNING)
+        for job in running:
+            beat = job.heartbeat_at or job.started_at
+            if job.worker_pid and job.worker_host == host and not _pid_alive(job.worker_pid):
+                error = f"обработчик (pid {job.worker_pid}) остановился, не завершив задачу"
+            elif beat and beat < now - timedelta(seconds=timeout):
+                error = f"обработчик не отвечает больше {timeout} с"
+            else:
+                continue
+            logger.warning("ingest job %s: %s", job.pk, error)
+            IngestJob.objects.filter(pk=job.pk).update(status=IngestJob.FAILED, error=error, finished_at=now)
+            reaped += 1
+    return reaped
+
+
+def run_job(job) -> None:
+    """Выполняет задачу: файлы берутся из MEDIA_ROOT, прогресс пишется в job.progress."""
+    files = {k: os.path.join(settings.MEDIA_ROOT, rel) for k, rel in (job.files or {}).items()}
+
+    try:
+        messages = run_ingest(files, report=JobReporter(job.pk), mode=job.mode)
+        status, error = IngestJob.DONE, ''
+    except Exception as e:
+        logger.exception("ingest job %s failed", job.pk)
+        messages, status, error = [], IngestJob.FAILED, str(e)
+
+    # только из running: задачу, которую reap_stale_jobs уже пометил failed, не «оживляем»
+    finished = IngestJob.objects.filter(pk=job.pk, status=IngestJob.RUNNING).update(
+        status=status, messages=messages, error=error, finished_at=timezone.now(),
+    )
+    if not finished:
+        logger.warning("ingest job %s: finished after being marked failed, status kept", job.pk)
+        return
+    if status == IngestJob.DONE and job.files:
+        # файлы больше не нужны; при ошибке оставляем для разбора
+        job_dir = os.path.dirname(files[next(iter(files))])
+        shutil.rmtree(job_dir, ignore_errors=True)
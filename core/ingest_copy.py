@@ -0,0 +1,64 @@
+# core/ingest_copy.py
+import functools
+import io
+import tempfile
+import time
+from typing import Tuple
+
+import pandas as pd
+
+# Буфер держим в памяти до 32 МБ, дальше — во временном файле
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+COPY_NULL = r'\N'
+
+
+def quote_ident(name: str) -> str:
+    """Экранирует имя колонки (нужно для "ac.client_hash", "t.p2p_flg")."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+@functools.lru_cache(maxsize=64)
+def copy_sql(table: str, columns: Tuple[str, ...]) -> str:
+    """COPY-запрос для (таблица, колонки); собирается один раз на датасет."""
+    cols = ', '.join(quote_ident(c) for c in columns)
+    return f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+
+
+def copy_frame(cursor, table: str, df: pd.DataFrame) -> Tuple[int, float]:
+    """
+    Заливает нормализованный DataFrame через COPY ... FROM STDIN одним
+    запросом: CSV пишет pandas целиком (без построчного Python) в
+    SpooledTemporaryFile (память -> диск при росте), колонки df = колонки
+    таблицы. Возвращает (кол-во строк, секунды).
+    """
+    started = time.monotonic()
+    count = len(df.index)
+    if not count:
+        return 0, time.monotonic() - started
+    copy_expert = getattr(cursor, 'copy_expert', None)
+    if copy_expert is None:
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        rows = [tuple(v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in row) for row in rows]
+        _insert_many(cursor, table, list(df.columns), rows)
+        return count, time.monotonic() - started
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode='w+b') as raw:
+        buf = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        df.to_csv(buf, header=False, index=False, na_rep=COPY_NULL, lineterminator='\n')
+        buf.flush()
+        buf.detach()
+        raw.seek(0)
+        copy_expert(copy_sql(table, tuple(df.columns)), raw)
+    return count, time.monotonic() - started
+
+
+def _insert_many(cursor, table, columns, rows):
+    cols = ', '.join(quote_ident(c) for c in columns)
+    marks = ','.join(['%s'] * len(columns))
+    cursor.executemany(f'INSERT INTO {table} ({cols}) VALUES ({marks})', rows)
+
+
+def rate_text(count: int, seconds: float) -> str:
+    """'12 345 строк/с' для сообщений загрузки."""
+    rate = count / seconds if seconds > 0 else count
+    return f"{int(rate):,} строк/с".replace(',', ' ')
@@ -0,0 +1,189 @@
+# core/ingest_normalize.py
+"""
+Колоночные конвертеры для загрузки (Series -> Series, без iterrows()).
+
+Какие колонки каким конвертером приводятся — описано в ingest_spec.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pytz
+from pandas.api import types as ptypes
+
+moscow_tz = pytz.timezone("Europe/Moscow")
+
+SMALLINT_RANGE = (-32768, 32767)
+INT_RANGE = (-2147483648, 2147483647)
+BIGINT_RANGE = (-9223372036854775808, 9223372036854775807)
+
+TRUE_TOKENS = ('1', 'true', 't', 'yes', 'y')
+FALSE_TOKENS = ('0', 'false', 'f', 'no', 'n', '')
+
+_INT_RE = r'[+-]?\d+'
+
+
+# -------------------- Колоночные конвертеры --------------------
+
+def _is_textual(s: pd.Series) -> bool:
+    return ptypes.is_object_dtype(s) or ptypes.is_string_dtype(s)
+
+
+def blank_mask(s: pd.Series) -> pd.Series:
+    """
+    True там, где исходное значение — текст '' или 'NaT': такие даты
+    считаются «пустыми», а не битыми (как в прежней построчной проверке).
+    Пустая ячейка (None/NaN) — не «пустая»: прежний pd.read_excel отдавал
+    за неё NaN, и строка отбрасывалась. openpyxl в read_only отдаёт None —
+    без этого правила такие строки уходили бы в таблицу с NULL.
+    """
+    if not _is_textual(s):
+        return pd.Series(False, index=s.index)
+    return s.isin(['', 'NaT']).fillna(False).astype(bool)
+
+
+def _wall_time(v):
+    ts = pd.to_datetime(v, errors='coerce')
+    return pd.NaT if pd.isna(ts) else ts.tz_localize(None)
+
+
+def _parse_datetime(s: pd.Series) -> pd.Series:
+    """
+    Разбор колонки в datetime64 с «настенным» временем: смещение отбрасывается
+    (Timestamp.tz_localize(None)), время не пересчитывается.
+    """
+    if ptypes.is_datetime64_any_dtype(s):
+        out = s
+    else:
+        try:
+            out = pd.to_datetime(s, errors='coerce', format='mixed')
+        except ValueError:
+            # разные смещения в одной колонке — редкий случай, разбираем поэлементно
+            out = pd.to_datetime(s.map(_wall_time), errors='coerce')
+    if getattr(out.dt, 'tz', None) is not None:
+        out = out.dt.tz_localize(None)
+    return out
+
+
+def to_naive_datetime(s: pd.Series) -> pd.Series:
+    """datetime без таймзоны (настенное время) или NaT для неразборчивых значений."""
+    return _parse_datetime(s)
+
+
+def to_aware_datetime(s: pd.Series, tz=moscow_tz) -> pd.Series:
+    """Naive значения локализуются в tz (по умолчанию Europe/Moscow), aware остаются как есть."""
+    if ptypes.is_datetime64_any_dtype(s):
+        out = s
+    else:
+        try:
+            out = pd.to_datetime(s, errors='coerce', format='mixed')
+        except ValueError:
+            # разные смещения в одной колонке: приводим к общему UTC
+            out = pd.to_datetime(s, errors='coerce', utc=True, format='mixed')
+    if getattr(out.dt, 'tz', None) is None:
+        out = out.dt.tz_localize(tz, ambiguous='NaT', nonexistent='NaT')
+    return out
+
+
+def to_date(s: pd.Series) -> pd.Series:
+    """Дата (полночь, без таймзоны) или NaT для неразборчивых значений."""
+    return _parse_datetime(s).dt.normalize()
+
+
+def to_int(s: pd.Series, bounds: Tuple[int, int] = BIGINT_RANGE) -> pd.Series:
+    """
+    Целые как nullable Int64 с проверкой диапазона (smallint/int/bigint).
+    Строки разбираются точно (без потери точности на 18-значных хэшах),
+    числа принимаются, только если они целые.
+    """
+    lo, hi = bounds
+    out = pd.Series(pd.NA, index=s.index, dtype='Int64')
+    if ptypes.is_bool_dtype(s):
+        out = s.astype('Int64')
+    elif ptypes.is_integer_dtype(s):
+        out = s.astype('Int64')
+    elif ptypes.is_float_dtype(s):
+        ok = s.notna() & np.isfinite(s) & (s == np.floor(s)) & (s.abs() < 2 ** 63)
+        out[ok] = s[ok].astype('int64')
+    else:
+        txt = s.astype('string').str.strip()
+        exact = txt.str.fullmatch(_INT_RE).fillna(False).astype(bool)
+        short = exact & (txt.str.lstrip('+-').str.len() <= 18)
+        if short.any():
+            # через object -> int64: точный разбор без промежуточного float
+            out[short] = txt[short].to_numpy(dtype=object).astype(np.int64)
+        long_ = exact & ~short
+        if long_.any():
+            big = txt[long_].map(int)
+            big = big[(big >= lo) & (big <= hi)]
+            out[big.index] = big.astype('int64')
+        rest = ~exact & s.notna()
+        if rest.any():
+            num = pd.to_numeric(s[rest], errors='coerce').astype('float64')
+            ok = num.notna() & np.isfinite(num) & (num == np.floor(num)) & (num.abs() < 2 ** 63)
+            out[ok[ok].index] = num[ok].astype('int64')
+    return out.where((out >= lo) & (out <= hi))
+
+
+def to_decimal(s: pd.Series) -> pd.Series:
+    """
+    Аналог to_decimal_or_none: числа остаются числами, строки — строками
+    (без округления через float), нечисловое -> NULL.
+    """
+    if ptypes.is_bool_dtype(s):
+        return s.astype('Int64')
+    if ptypes.is_numeric_dtype(s):
+        return s.where(np.isfinite(s.astype('float64')))
+    valid = pd.to_numeric(s, errors='coerce').notna()
+    txt = s.astype('string').str.strip()
+    return txt.where(valid).astype(object).where(valid, None)
+
+
+def to_float(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors='coerce').astype('float64')
+
+
+def to_text(s: pd.Series, strip: bool = False, upper: bool = False,
+            max_len: Optional[int] = None) -> pd.Series:
+    """
+    Аналог `value or None`: NaN и пустые строки -> NULL. Целые float
+    (1111111111.0 из-за NaN в колонке) выводятся без '.0'.
+    """
+    if ptypes.is_float_dtype(s):
+        ints = to_int(s)
+        txt = ints.astype('string').where(ints.notna(), s.astype('string'))
+        txt = txt.where(s.notna())
+    else:
+        txt = s.astype('string')
+    if strip:
+        txt = txt.str.strip()
+    if upper:
+        txt = txt.str.upper()
+    if max_len:
+        txt = txt.str.slice(0, max_len)
+    txt = txt.where(txt != '')
+    return txt.astype(object).where(txt.notna(), None)
+
+
+def to_bool_int(s: pd.Series) -> pd.Series:
+    """
+    Аналог to_int_bool_or_none: токены true/false -> 1/0, числа -> 1 если != 0,
+    прочие непустые значения -> 1, NaN -> NULL.
+    """
+    out = pd.Series(pd.NA, index=s.index, dtype='Int8')
+    present = s.notna()
+    if not present.any():
+        return out
+    if ptypes.is_bool_dtype(s) or ptypes.is_numeric_dtype(s):
+        out[present] = (s[present].astype('float64') != 0).astype('int8')
+        return out
+    txt = s.astype('string').str.strip().str.lower()
+    is_true = txt.isin(TRUE_TOKENS) & present
+    is_false = txt.isin(FALSE_TOKENS) & present
+    out[is_true] = 1
+    out[is_false] = 0
+    rest = present & ~is_true & ~is_false
+    if rest.any():
+        num = pd.to_numeric(s[rest], errors='coerce')
+        out[rest] = (num.isna() | (num != 0)).astype('int8')
+    return out
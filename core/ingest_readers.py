@@ -0,0 +1,200 @@
+# core/ingest_readers.py
+"""
+Потоковое чтение загружаемых файлов порциями (DataFrame по chunk_size строк).
+
+Формат определяется по сигнатуре файла, затем по расширению (READERS ниже);
+все ридеры отдают одинаковые порции, дальше — общая нормализация и COPY.
+Файл целиком в память не поднимается.
+"""
+import csv
+import os
+from typing import Iterator, List, Optional, Sequence
+
+import pandas as pd
+from django.conf import settings
+from openpyxl import load_workbook
+
+DEFAULT_CHUNK_ROWS = 50_000
+SNIFF_BYTES = 64 * 1024
+
+
+def chunk_rows() -> int:
+    return int(getattr(settings, 'INGEST_CHUNK_ROWS', DEFAULT_CHUNK_ROWS) or DEFAULT_CHUNK_ROWS)
+
+
+def _header(values: Sequence) -> List[str]:
+    # как у pandas: пустой заголовок -> 'Unnamed: N'
+    return [f'Unnamed: {i}' if v is None else str(v) for i, v in enumerate(values)]
+
+
+def _frame(rows: List[tuple], columns: List[str]) -> pd.DataFrame:
+    return pd.DataFrame.from_records(rows, columns=columns, coerce_float=False)
+
+
+def iter_excel_chunks(source, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Читает первый лист xlsx (как pd.read_excel по умолчанию) и отдаёт порции
+    по chunk_size строк. Значения приходят как есть от openpyxl (object-колонки),
+    типы приводит нормализация.
+    """
+    size = chunk_size or chunk_rows()
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        head = next(rows, None)
+        if head is None:
+            return
+        columns = _header(head)
+        width = len(columns)
+        buf: List[tuple] = []
+        for row in rows:
+            if len(row) != width:
+                row = tuple(row[:width]) + (None,) * (width - len(row))
+            buf.append(row)
+            if len(buf) >= size:
+                yield _frame(buf, columns)
+                buf = []
+        if buf:
+            yield _frame(buf, columns)
+    finally:
+        wb.close()
+
+
+def iter_xls_chunks(source, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Старый .xls (нужен xlrd): потокового режима нет, читаем целиком и режем."""
+    size = chunk_size or chunk_rows()
+    df = pd.read_excel(source, sheet_name=0, dtype=object)
+    for start in range(0, len(df.index), size):
+        yield df.iloc[start:start + size].reset_index(drop=True)
+
+
+def _text_encoding(sample: bytes) -> str:
+    # выгрузки из 1С/Excel бывают в cp1251
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # обрыв многобайтного символа на границе образца — это всё ещё utf-8
+        if e.start < len(sample) - 3:
+            return 'cp1251'
+    return 'utf-8-sig'
+
+
+def _csv_delimiter(sample: bytes, encoding: str) -> str:
+    text = sample.decode(encoding, errors='ignore')
+    try:
+        return csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=',;\t|').delimiter
+    except csv.Error:
+        return ','
+
+
+def iter_csv_chunks(source, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    CSV порциями через pd.read_csv(chunksize=...). Разделитель (, ; tab |)
+    и кодировка (utf-8 / cp1251) определяются по началу файла. Все значения
+    читаются строками — типы приводит нормализация, как и для xlsx.
+    """
+    size = chunk_size or chunk_rows()
+    sample = _peek(source, SNIFF_BYTES)
+    encoding = _text_encoding(sample)
+    reader = pd.read_csv(
+        source, sep=_csv_delimiter(sample, encoding), encoding=encoding,
+        dtype=str, chunksize=size,
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def iter_parquet_chunks(source, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Parquet по row group'ам через pyarrow (requirements.txt)."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("для чтения Parquet нужен пакет pyarrow")
+    size = chunk_size or chunk_rows()
+    pf = pq.ParquetFile(source)
+    try:
+        for batch in pf.iter_batches(batch_size=size):
+            yield batch.to_pandas()
+    finally:
+        pf.close()
+
+
+def iter_ndjson_chunks(source, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """NDJSON (объект на строку) порциями; даты не угадываем — их разбирает нормализация."""
+    size = chunk_size or chunk_rows()
+    reader = pd.read_json(source, lines=True, chunksize=size, dtype=False,
+                          convert_dates=False, encoding='utf-8')
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+# Реестр форматов: имя -> ридер. Новый формат = функция + запись здесь
+# (и при необходимости сигнатура/расширение ниже).
+READERS = {
+    'xlsx': iter_excel_chunks,
+    'xls': iter_xls_chunks,
+    'csv': iter_csv_chunks,
+    'parquet': iter_parquet_chunks,
+    'ndjson': iter_ndjson_chunks,
+}
+
+MAGIC = (
+    (b'PK\x03\x04', 'xlsx'),
+    (b'PAR1', 'parquet'),
+    (b'\xd0\xcf\x11\xe0', 'xls'),
+)
+
+EXTENSIONS = {
+    '.xlsx': 'xlsx', '.xlsm': 'xlsx', '.xls': 'xls',
+    '.csv': 'csv', '.tsv': 'csv', '.txt': 'csv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+    '.ndjson': 'ndjson', '.jsonl': 'ndjson',
+}
+
+# для <input accept="..."> на странице загрузки
+ACCEPT = ','.join(EXTENSIONS)
+
+
+def _peek(source, size: int) -> bytes:
+    """Первые байты файла (путь или файловый объект), позиция не сдвигается."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(size)
+    pos = source.tell()
+    try:
+        data = source.read(size)
+    finally:
+        source.seek(pos)
+    return data if isinstance(data, bytes) else data.encode('utf-8')
+
+
+def detect_format(source) -> str:
+    """
+    Бинарные форматы узнаём по сигнатуре, текстовые — по расширению,
+    а без него: '{' в начале -> NDJSON, иначе CSV.
+    """
+    head = _peek(source, SNIFF_BYTES)
+    for magic, fmt in MAGIC:
+        if head.startswith(magic):
+            return fmt
+    name = str(getattr(source, 'name', source) or '')
+    fmt = EXTENSIONS.get(os.path.splitext(name)[1].lower())
+    if fmt in ('csv', 'ndjson'):
+        return fmt
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if not text:
+        raise ValueError("пустой файл")
+    if text.startswith(b'{'):
+        return 'ndjson'
+    if b'\x00' in text:
+        raise ValueError("неподдерживаемый формат файла")
+    return 'csv'
+
+
+def iter_chunks(source, chunk_size: Optional[int] = None, fmt: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Порции DataFrame из файла любого поддерживаемого формата."""
+    fmt = fmt or detect_format(source)
+    return READERS[fmt](source, chunk_size)
@@ -0,0 +1,240 @@
+# core/ingest_spec.py
+"""
+Декларативное описание загружаемых датасетов.
+
+Датасет = целевая таблица + список полей. Поле описывает: колонку в файле
+(source) и её старые названия (aliases), колонку таблицы (target), тип,
+допустимость NULL и диапазон. По описанию один раз собирается колоночный
+нормализатор (DATASETS[key]['normalize']) и список колонок для COPY.
+Новая колонка или новый фид — правка только здесь.
+
+after_publish — хук в транзакции публикации (обновление производных таблиц).
+
+Колонки файла приходят уже в виде prepare_frame: '.' -> '_'
+('ac.client_hash' -> 'ac_client_hash').
+"""
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from .client_daily import after_c_publish, after_tr_publish
+from .debt_snapshot import after_city_source_publish, after_dog_publish
+from .ingest_normalize import (
+    BIGINT_RANGE, INT_RANGE, SMALLINT_RANGE,
+    blank_mask, to_aware_datetime, to_bool_int, to_date, to_decimal, to_float,
+    to_int, to_naive_datetime, to_text,
+)
+from .so_link import relink_after_c_publish, relink_after_so_publish
+
+# тип поля -> колоночный конвертер
+TYPES = {
+    'text': to_text,
+    'int': to_int,
+    'decimal': to_decimal,
+    'float': to_float,
+    'date': to_date,
+    'datetime': to_naive_datetime,      # «настенное» время без таймзоны
+    'datetime_tz': to_aware_datetime,   # aware, Europe/Moscow
+    'bool_int': to_bool_int,            # true/false/1/0 -> 1/0
+}
+
+
+def field(target: str, type: str, source: Optional[str] = None, aliases: Tuple[str, ...] = (),
+          nullable: bool = True, range: Optional[Tuple[int, int]] = None,
+          strict: bool = False, fallback: Optional[str] = None, default=None, **options) -> dict:
+    """
+    Описание одного поля.
+      source    колонка файла (по умолчанию target с '.' -> '_')
+      aliases   запасные названия колонки (старые шаблоны)
+      nullable  False: строки, где после приведения NULL, отбрасываются
+      range     границы для int (вне диапазона -> NULL)
+      strict    значение не приводится к типу или ячейка пуста -> строка
+                отбрасывается (текст '' / 'NaT' и отсутствие колонки — NULL)
+      fallback  target другого (уже описанного выше) поля: им заполняются NULL
+      default   значение, если колонки нет в файле
+      options   параметры конвертера (strip/upper/max_len для text)
+    """
+    if type not in TYPES:
+        raise ValueError(f"неизвестный тип поля {target}: {type}")
+    return dict(
+        target=target, type=type, source=source or target.replace('.', '_'),
+        aliases=tuple(aliases), nullable=nullable, range=range, strict=strict,
+        fallback=fallback, default=default, options=options,
+    )
+
+
+def hooks(*funcs):
+    """Несколько after_publish-хуков одного датасета — по очереди, в одной транзакции."""
+    def after_publish(cur, stage, lo=None, hi=None):
+        for func in funcs:
+            func(cur, stage, lo, hi)
+    return after_publish
+
+
+# -------------------- Датасеты --------------------
+
+DATASETS = {
+    'cs': dict(
+        label='Cs', table='cber_schema.cs', part_column='date_part',
+        after_publish=after_city_source_publish,
+        unread_msg=None, empty_msg=None, bad_msg=None,
+        fields=[
+            field('ac.client_hash', 'text', strip=True),
+            field('eventaction', 'text'),
+            field('geolatitude', 'float'),
+            field('geolongitude', 'float'),
+            field('dt', 'datetime_tz'),
+            field('date_part', 'date'),
+        ],
+    ),
+    'c': dict(
+        label='C', table='c', part_column='day_part',
+        after_publish=hooks(after_c_publish, relink_after_c_publish),
+        unread_msg="C: файл не прочитан (пропущено)",
+        empty_msg="C: нет валидных строк для вставки (после фильтра дат)",
+        bad_msg="пропущено {n} строк с некорректной c_txn_dt",
+        fields=[
+            field('src', 'text'),
+            field('ac.client_hash', 'text', strip=True),
+            field('c_txn_dt', 'datetime', strict=True),
+            field('txn_cod_type_rk', 'int', range=INT_RANGE),
+            field('txn_cod_type_name', 'text'),
+            field('c_txn_rub_amt', 'decimal'),
+            field('pmnt_payer_name', 'text'),
+            field('day_part', 'date'),
+        ],
+    ),
+    'tr': dict(
+        label='Tr', table='tr', part_column='day_part',
+        after_publish=hooks(after_city_source_publish, after_tr_publish),
+        unread_msg="Tr: файл не прочитан (пропущено)",
+        empty_msg="Tr: нет валидных строк для вставки (после фильтра дат)",
+        bad_msg="пропущено {n} строк с некорректной c_txn_dt",
+        # шаблон tr использует имена колонок c; старый шаблон — txn_cod_type_rk/pmnt_payer_name
+        fields=[
+            field('t_src', 'text', source='src'),
+            field('t_client_hash', 'text', source='ac_client_hash', strip=True),
+            field('t_evt_posted_dttm', 'datetime', source='c_txn_dt', strict=True),
+            field('t_trx_city', 'text'),
+            field('t_mcc_code', 'int', aliases=('txn_cod_type_rk',), range=INT_RANGE),
+            field('t_trans_type', 'int', range=INT_RANGE),
+            field('t_trx_direction', 'text', default='D', strip=True, upper=True, max_len=1),
+            field('t_merchant_id', 'text'),
+            field('t_terminal_id', 'text'),
+            field('t_merchant_name', 'text', aliases=('pmnt_payer_name',)),
+            field('t_amt', 'decimal', source='c_txn_rub_amt'),
+            field('day_part', 'date'),
+        ],
+    ),
+    'so': dict(
+        label='So', table='so', part_column='day_part',
+        after_publish=relink_after_so_publish,
+        unread_msg="So: файл не прочитан (пропущено)",
+        empty_msg="So: нет валидных строк для вставки",
+        bad_msg="пропущено {n} строк из-за некорректных дат",
+        fields=[
+            field('ac.client_hash', 'int', range=BIGINT_RANGE),
+            field('erib_id', 'text'),
+            field('oper_rur_amt', 'decimal'),
+            field('login_type', 'text'),
+            field('oper_type', 'text'),
+            field('date_time_oper', 'datetime', strict=True),
+            field('date_create', 'date'),
+            field('date_time_create', 'datetime', strict=True),
+            field('doc_type', 'text'),
+            field('receiver_client_hash', 'int', range=BIGINT_RANGE),
+            field('t.p2p_flg', 'int', range=SMALLINT_RANGE),
+            # day_part в файле so часто нет — берём дату операции
+            field('day_part', 'date', fallback='date_time_oper'),
+        ],
+    ),
+    'dog': dict(
+        label='Dog', table='core_dog', part_column='day_part',
+        after_publish=after_dog_publish,
+        unread_msg="Dog: файл не прочитан (пропущено)",
+        empty_msg="Dog: нет строк для вставки",
+        bad_msg=None,
+        fields=[
+            field('ac_client_hash', 'int', range=BIGINT_RANGE),
+            *(field(name, 'decimal') for name in (
+                'debt_due_bal_ccy_amt', 'debt_due_bal_rub_amt',
+                'debt_overdue_bal_ccy_amt', 'debt_overdue_bal_rub_amt',
+                'debt_intr_overdue_bal_ccy_amt', 'debt_intr_overdue_bal_rub_amt',
+                'debt_tot_os_ccy_amt', 'debt_tot_os_rub_amt',
+            )),
+            field('overdue_duration_days', 'int', range=INT_RANGE),
+            field('debt_os_max_rub_amt', 'decimal'),
+            field('debt_ovrd_max_rub_amt', 'decimal'),
+            field('ovrd_max_dur_days', 'int', range=INT_RANGE),
+            field('ovrd_tot_ever_days', 'int', range=INT_RANGE),
+            field('ovrd_tot_entr_ever_qty', 'int', range=INT_RANGE),
+            field('ovrd_max_rub_amt', 'decimal'),
+            field('total_overdue_duration_days', 'int', range=INT_RANGE),
+            field('ovrd_tot_period_qty', 'int', range=INT_RANGE),
+            field('ovrd_intr_bal_max_rub_amt', 'decimal'),
+            field('ovrd_intr_nobal_max_rub_amt', 'decimal'),
+            field('total_overdue_intr_bal_duration_days', 'int', range=INT_RANGE),
+            field('total_overdue_intr_nobal_duration_days', 'int', range=INT_RANGE),
+            field('overdue_bucket_id', 'int', range=INT_RANGE),
+            field('overdue_bucket_name', 'text'),
+            field('npl_nflag', 'bool_int'),
+            field('day_part', 'date'),
+        ],
+    ),
+}
+
+
+# -------------------- Компиляция --------------------
+
+def _converter(f: dict):
+    """Функция Series -> Series для поля (тип + параметры связываются один раз)."""
+    convert = TYPES[f['type']]
+    kwargs = dict(f['options'])
+    if f['range'] is not None:
+        kwargs['bounds'] = f['range']
+    if not kwargs:
+        return convert
+    return lambda s: convert(s, **kwargs)
+
+
+def _bad(raw: pd.Series, value: pd.Series) -> pd.Series:
+    """После приведения — NULL, а в файле было не '' / 'NaT' (в т.ч. пустая ячейка)."""
+    return value.isna() & ~blank_mask(raw)
+
+
+def compile_dataset(spec: dict):
+    """
+    Собирает нормализатор датасета: DataFrame файла -> (DataFrame в колонках
+    таблицы, число отброшенных строк).
+    """
+    fields = [(f, _converter(f)) for f in spec['fields']]
+
+    def normalize(df: pd.DataFrame):
+        data = {}
+        bad = pd.Series(False, index=df.index)
+        for f, convert in fields:
+            src = next((c for c in (f['source'], *f['aliases']) if c in df.columns), None)
+            if src is None:
+                raw = pd.Series(f['default'], index=df.index, dtype=object)
+            else:
+                raw = df[src]
+            value = convert(raw)
+            if f['strict'] and src is not None:
+                # нет колонки в файле — не битые значения, а NULL (как row.get() раньше)
+                bad |= _bad(raw, value)
+            if f['fallback']:
+                value = value.fillna(convert(data[f['fallback']]))
+            if not f['nullable']:
+                bad |= value.isna()
+            data[f['target']] = value
+        out = pd.DataFrame(data, index=df.index)
+        if bad.any():
+            out = out[~bad]
+        return out, int(bad.sum())
+
+    return normalize
+
+
+for _spec in DATASETS.values():
+    _spec['columns'] = tuple(f['target'] for f in _spec['fields'])
+    _spec['normalize'] = compile_dataset(_spec)
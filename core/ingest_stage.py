@@ -0,0 +1,239 @@
+# core/ingest_stage.py
+"""
+Staging для загрузки: данные сначала целиком заливаются COPY в отдельную
+таблицу, целевая таблица меняется одной короткой транзакцией. Читатели
+(clients_table_view, client_detail_view, HeatmapAPI) видят либо старые
+данные, либо новые — никогда половину.
+
+  append        — TEMP-таблица -> INSERT ... SELECT
+  replace_range — TEMP-таблица -> DELETE диапазона day_part + INSERT ... SELECT
+  clear         — UNLOGGED-копия целевой таблицы: после загрузки строятся
+                  индексы, SET LOGGED, ANALYZE, затем подмена через RENAME.
+                  Если на таблицу ссылаются view/FK (rename их не переносит),
+                  подмена делается DELETE + INSERT в одной транзакции.
+"""
+import logging
+import re
+import time
+
+from django.db import connection, transaction
+
+from .ingest_copy import quote_ident
+from .models import DataVersion, IngestJob
+
+logger = logging.getLogger(__name__)
+
+# сколько ждать ACCESS EXCLUSIVE на rename, прежде чем повторить
+SWAP_LOCK_TIMEOUT = '5s'
+SWAP_ATTEMPTS = 3
+
+
+def _resolve(cur, table: str):
+    """(schema, name) реальной таблицы с учётом search_path."""
+    cur.execute(
+        "SELECT n.nspname, c.relname FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.oid = %s::regclass",
+        [table],
+    )
+    return cur.fetchone()
+
+
+def _qualified(schema: str, name: str) -> str:
+    return f'{quote_ident(schema)}.{quote_ident(name)}'
+
+
+def _has_dependents(cur, table: str) -> bool:
+    """View/матвью или внешние ключи, которые после RENAME остались бы на старой таблице."""
+    cur.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_depend d JOIN pg_rewrite r ON r.oid = d.objid "
+        "               WHERE d.refobjid = %s::regclass AND r.ev_class <> d.refobjid) "
+        "    OR EXISTS (SELECT 1 FROM pg_constraint WHERE confrelid = %s::regclass)",
+        [table, table],
+    )
+    return cur.fetchone()[0]
+
+
+class Stage:
+    """
+    Промежуточная таблица одного датасета. create() вызывается на первой
+    порции (колонки берутся из нормализованного DataFrame), publish() —
+    после загрузки всех порций, discard() — при ошибке.
+    """
+
+    def __init__(self, key: str, table: str, mode: str, part_column: str, after_publish=None):
+        self.key = key
+        self.table = table
+        self.mode = mode
+        self.part_column = part_column
+        # after_publish(cur, stage, lo, hi) — в транзакции публикации (производные таблицы)
+        self.after_publish = after_publish
+        self.name = None
+        self.columns = None
+        self._lo = self._hi = None
+        self._target = None      # (schema, name) для clear
+        self._locked = False
+
+    @property
+    def ready(self) -> bool:
+        return self.name is not None
+
+    # ---------- создание ----------
+
+    def create(self, cur, columns):
+        self.columns = list(columns)
+        if self.mode == IngestJob.CLEAR:
+            self._create_swap_copy(cur)
+        else:
+            self._create_temp(cur)
+
+    def _create_temp(self, cur):
+        # сессионная TEMP-таблица: не пишет WAL, не видна другим соединениям
+        self.name = f'ingest_stage_{self.key}'
+        cols = ', '.join(quote_ident(c) for c in self.columns)
+        cur.execute(f'DROP TABLE IF EXISTS {self.name}')
+        cur.execute(f'CREATE TEMP TABLE {self.name} AS SELECT {cols} FROM {self.table} WITH NO DATA')
+
+    def _create_swap_copy(self, cur):
+        schema, name = self._target = _resolve(cur, self.table)
+        # полная замена одной таблицы — строго по одной за раз
+        cur.execute('SELECT pg_advisory_lock(hashtext(%s))', [f'ingest_swap:{schema}.{name}'])
+        self._locked = True
+        self.name = _qualified(schema, f'{name}__stage')
+        cur.execute(f'DROP TABLE IF EXISTS {self.name}')
+        # без индексов: они строятся после загрузки, так COPY быстрее
+        cur.execute(
+            f'CREATE UNLOGGED TABLE {self.name} (LIKE {_qualified(schema, name)} '
+            f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY '
+            f'INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS)'
+        )
+
+    # ---------- публикация ----------
+
+    def publish(self, lo=None, hi=None) -> dict:
+        """
+        Переносит данные в целевую таблицу. Возвращает
+        {'deleted': N или None, 'swapped': bool}.
+        """
+        self._lo, self._hi = lo, hi
+        try:
+            if self.mode == IngestJob.CLEAR:
+                return self._publish_swap()
+            return self._publish_insert(lo, hi)
+        finally:
+            self.discard()
+
+    def _after_publish(self, cur):
+        # новое поколение данных — кэши производных значений устаревают вместе с коммитом
+        DataVersion.bump(cur)
+        if self.after_publish:
+            self.after_publish(cur, self, self._lo, self._hi)
+
+    def _insert_select(self, cur, target: str):
+        cols = ', '.join(quote_ident(c) for c in self.columns)
+        cur.execute(f'INSERT INTO {target} ({cols}) SELECT {cols} FROM {self.name}')
+
+    def _publish_insert(self, lo, hi) -> dict:
+        deleted = None
+        with transaction.atomic(), connection.cursor() as cur:
+            if self.mode == IngestJob.REPLACE_RANGE:
+                part = quote_ident(self.part_column)
+                cur.execute(f'DELETE FROM {self.table} WHERE {part} BETWEEN %s AND %s', [lo, hi])
+                deleted = cur.rowcount
+            self._insert_select(cur, self.table)
+            self._after_publish(cur)
+        return {'deleted': deleted, 'swapped': False}
+
+    def _publish_swap(self) -> dict:
+        schema, name = self._target
+        target = _qualified(schema, name)
+        with connection.cursor() as cur:
+            if _has_dependents(cur, target):
+                # rename сломал бы view/FK — подмена содержимого одной транзакцией
+                with transaction.atomic():
+                    cur.execute(f'DELETE FROM {target}')
+                    deleted = cur.rowcount
+                    self._insert_select(cur, target)
+                    self._after_publish(cur)
+                return {'deleted': deleted, 'swapped': False}
+
+            indexes = self._build_indexes(cur, target)
+            cur.execute(f'ALTER TABLE {self.name} SET LOGGED')
+            cur.execute(f'ANALYZE {self.name}')
+            sequences = self._owned_sequences(cur, target)
+            cur.execute(f'SELECT count(*) FROM {target}')
+            deleted = cur.fetchone()[0]
+
+            old = f'{name}__old'
+            for attempt in range(1, SWAP_ATTEMPTS + 1):
+                try:
+                    with transaction.atomic():
+                        cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+                        cur.execute(f'DROP TABLE IF EXISTS {_qualified(schema, old)}')
+                        cur.execute(f'ALTER TABLE {target} RENAME TO {quote_ident(old)}')
+                        cur.execute(f'ALTER TABLE {self.name} RENAME TO {quote_ident(name)}')
+                        # serial-последовательности переходят к новой таблице, иначе DROP их удалит
+                        for seq, col in sequences:
+                            cur.execute(f'ALTER SEQUENCE {seq} OWNED BY {target}.{quote_ident(col)}')
+                        cur.execute(f'DROP TABLE {_qualified(schema, old)}')
+                        for tmp, orig in indexes:
+                            cur.execute(f'ALTER INDEX {_qualified(schema, tmp)} RENAME TO {quote_ident(orig)}')
+                        self._after_publish(cur)
+                    break
+                except Exception as e:
+                    if attempt == SWAP_ATTEMPTS or 'lock timeout' not in str(e):
+                        raise
+                    logger.warning("%s: swap lock timeout, retry %s", self.key, attempt)
+                    time.sleep(attempt)
+        self.name = None  # stage стал целевой таблицей
+        return {'deleted': deleted, 'swapped': True}
+
+    def _build_indexes(self, cur, target: str):
+        """
+        Повторяет индексы и PK/UNIQUE целевой таблицы на stage под временными
+        именами; после подмены они переименовываются обратно.
+        """
+        cur.execute(
+            "SELECT ic.relname, pg_get_indexdef(i.indexrelid), con.conname, "
+            "       pg_get_constraintdef(con.oid) "
+            "FROM pg_index i JOIN pg_class ic ON ic.oid = i.indexrelid "
+            "LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.contype IN ('p', 'u') "
+            "WHERE i.indrelid = %s::regclass",
+            [target],
+        )
+        renames = []
+        for idx_name, idx_def, con_name, con_def in cur.fetchall():
+            tmp = f'{idx_name[:55]}__stage'
+            if con_name:
+                cur.execute(f'ALTER TABLE {self.name} ADD CONSTRAINT {quote_ident(tmp)} {con_def}')
+            else:
+                sql = re.sub(r'^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+',
+                             lambda m: f'CREATE {m.group(1) or ""}INDEX {quote_ident(tmp)} ON {self.name}',
+                             idx_def)
+                cur.execute(sql)
+            renames.append((tmp, idx_name))
+        return renames
+
+    def _owned_sequences(self, cur, target: str):
+        cur.execute(
+            "SELECT s.oid::regclass::text, a.attname FROM pg_depend d "
+            "JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S' "
+            "JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid "
+            "WHERE d.refobjid = %s::regclass AND d.deptype = 'a'",
+            [target],
+        )
+        return cur.fetchall()
+
+    # ---------- уборка ----------
+
+    def discard(self):
+        try:
+            with connection.cursor() as cur:
+                if self.name:
+                    cur.execute(f'DROP TABLE IF EXISTS {self.name}')
+                if self._locked:
+                    schema, name = self._target
+                    cur.execute('SELECT pg_advisory_unlock(hashtext(%s))', [f'ingest_swap:{schema}.{name}'])
+        except Exception:
+            logger.exception("%s: stage cleanup failed", self.key)
+        self.name = None
+        self._locked = False
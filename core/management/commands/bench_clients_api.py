@@ -0,0 +1,76 @@
+# core/management/commands/bench_clients_api.py
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from rest_framework.renderers import JSONRenderer
+
+from core.clients_query import client_filters, filtered_clients, order_clients
+from core.models import ClientDebtSnapshot
+from core.renderers import FastJSONRenderer
+from core.serializers import CLIENT_DEBT_COLUMNS, ClientDebtSerializer, client_debt_row
+
+#$ python manage.py bench_clients_api                       # страницы из client_debt_snapshot
+#$ python manage.py bench_clients_api --synthetic --page-size 200 --repeat 500
+
+
+class Command(BaseCommand):
+    help = "Сравнение сериализации ClientsListAPI: модели + ClientDebtSerializer против values_list + orjson"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--synthetic', action='store_true',
+                            help='Без БД: строки генерируются в памяти (только сериализация)')
+
+    def handle(self, *args, **opts):
+        size, repeat = opts['page_size'], opts['repeat']
+        if opts['synthetic']:
+            old, new = self._synthetic(size)
+        else:
+            qs = order_clients(filtered_clients(client_filters(QueryDict())), '-total_debt')
+            old = lambda: list(qs.only(*CLIENT_DEBT_COLUMNS)[:size])
+            new = lambda: list(qs.values_list(*CLIENT_DEBT_COLUMNS)[:size])
+
+        json_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        paths = {
+            'serializer + JSONRenderer': lambda: json_renderer.render(
+                {'results': ClientDebtSerializer(old(), many=True).data}),
+            'values_list + orjson': lambda: fast_renderer.render(
+                {'results': [client_debt_row(r) for r in new()]}),
+        }
+        a, b = (p() for p in paths.values())
+        if a != b:
+            self.stdout.write(self.style.WARNING("ответы различаются:\n%s\n%s" % (a[:300], b[:300])))
+
+        results = {}
+        for name, run in paths.items():
+            run()  # прогрев
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - started)
+            results[name] = times
+            self.stdout.write(
+                f"{name:<28} median {statistics.median(times) * 1000:8.3f} мс  "
+                f"p95 {sorted(times)[int(len(times) * 0.95) - 1] * 1000:8.3f} мс  (page_size={size}, n={repeat})"
+            )
+        old_m, new_m = (statistics.median(t) for t in results.values())
+        self.stdout.write(self.style.SUCCESS(f"ускорение: ×{old_m / new_m:.1f}"))
+
+    def _synthetic(self, size):
+        rng = random.Random(7)
+        buckets = ['0', '1-30', '30-60', '60-90', '90-120', '120-180', '180+']
+        tuples = [
+            (7_000_000_000_000_000_000 + i, Decimal(rng.randint(0, 10 ** 9)) / 100,
+             rng.choice(buckets), rng.choice([True, False, None]))
+            for i in range(size)
+        ]
+        models = [ClientDebtSnapshot(ac_client_hash=h, debt_tot_os_rub_amt=d, overdue_bucket_name=b, npl_nflag=n)
+                  for h, d, b, n in tuples]
+        return (lambda: models), (lambda: tuples)
+
@@ -0,0 +1,40 @@
+# core/management/commands/ensure_indexes.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.db_indexes import INDEXES, create_sql, ensure, state
+
+#$ python manage.py ensure_indexes             # создать недостающие (CONCURRENTLY)
+#$ python manage.py ensure_indexes --check     # только проверить, код возврата 1 если чего-то нет
+#$ python manage.py ensure_indexes --dry-run   # показать SQL
+
+
+class Command(BaseCommand):
+    help = "Создаёт и проверяет индексы горячих запросов для неуправляемых таблиц (core/db_indexes.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только проверить')
+        parser.add_argument('--dry-run', action='store_true', help='Показать SQL, ничего не создавать')
+
+    def handle(self, *args, **opts):
+        if connection.vendor != 'postgresql':
+            raise CommandError("нужен PostgreSQL")
+        problems = []
+        # autocommit: CREATE INDEX CONCURRENTLY нельзя внутри транзакции
+        with connection.cursor() as cur:
+            for ix in INDEXES:
+                current = state(cur, ix)
+                if opts['check'] or opts['dry_run'] or current in ('ok', 'no table'):
+                    if opts['dry_run'] and current in ('missing', 'invalid'):
+                        self.stdout.write(create_sql(ix) + ';')
+                    else:
+                        self.stdout.write(f"{ix.name:<28} {ix.table:<10} {current}")
+                    if current in ('missing', 'invalid'):
+                        problems.append(ix.name)
+                    continue
+                self.stdout.write(f"{ix.name:<28} {ix.table:<10} создаётся ({ix.used_by})...")
+                action = ensure(cur, ix)
+                self.stdout.write(self.style.SUCCESS(f"{ix.name:<28} {ix.table:<10} {action}"))
+
+        if opts['check'] and problems:
+            raise CommandError(f"нет или невалидны: {', '.join(problems)}")
@@ -0,0 +1,328 @@
+# core/management/commands/generate_load_data.py
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from core.buckets import register_buckets
+from core.client_daily import ROLLUPS, refresh as refresh_daily
+from core.debt_snapshot import refresh as refresh_snapshot
+from core.ingest_copy import copy_frame, rate_text
+from core.ingest_spec import DATASETS
+from core.management.commands.seed_demo_pro import CITIES, MERCH
+from core.mcc import mcc_codes
+from core.models import DataVersion
+from core.so_link import relink
+
+#$ python manage.py generate_load_data --clients 100000 --days 90 --events-per-day 1 --processes 4
+
+# Сгенерированные клиенты: хэши HASH_BASE + i (19 цифр — сравнение как текст = как число)
+HASH_BASE = 7_000_000_000_000_000_000
+
+# Профили клиентов по мотивам seed_demo_pro: доля, MCC-микс, распределение бакетов
+ARCHETYPES = [
+    dict(  # офисный
+        share=0.55,
+        mix=[('grocery', 0.35), ('coffee', 0.20), ('food', 0.15), ('ecom', 0.25), ('pharmacy', 0.05)],
+        buckets=[0.85, 0.09, 0.03, 0.02, 0.01, 0.0, 0.0],
+    ),
+    dict(  # таксист
+        share=0.30,
+        mix=[('fuel', 0.45), ('food', 0.15), ('coffee', 0.10), ('grocery', 0.20), ('transport', 0.10)],
+        buckets=[0.50, 0.25, 0.10, 0.07, 0.04, 0.02, 0.02],
+    ),
+    dict(  # онлайн-шоппер
+        share=0.15,
+        mix=[('ecom', 0.50), ('grocery', 0.20), ('food', 0.10), ('pharmacy', 0.10), ('coffee', 0.05), ('atm', 0.05)],
+        buckets=[0.20, 0.15, 0.15, 0.20, 0.10, 0.10, 0.10],
+    ),
+]
+BUCKETS = [(0, '0'), (1, '1-30'), (2, '30-60'), (3, '60-90'), (4, '90-120'), (5, '120-180'), (7, '180+')]
+# типичные дни просрочки по бакету (для overdue_duration_days)
+BUCKET_DAYS = [(0, 0), (1, 30), (31, 60), (61, 90), (91, 120), (121, 180), (181, 720)]
+
+SPB = (59.9343, 30.3351)
+HOTSPOTS = np.array([[59.93, 30.31], [59.74, 30.60], [59.80, 30.50]])
+CITY_NAMES = np.array([c for c in CITIES if c != '—'], dtype=object)
+
+HASH_COLUMNS = {
+    'cs': 'ac.client_hash', 'c': 'ac.client_hash', 'tr': 't_client_hash',
+    'so': 'ac.client_hash', 'dog': 'ac_client_hash',
+}
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _ts(day: np.ndarray, hour, minutes) -> np.ndarray:
+    return (day.astype('datetime64[m]') + np.timedelta64(60, 'm') * hour
+            + minutes.astype('timedelta64[m]'))
+
+
+def _pick(rng, values, size):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), size)]
+
+
+def _clients(rng, n):
+    shares = np.array([a['share'] for a in ARCHETYPES])
+    arch = rng.choice(len(ARCHETYPES), n, p=shares / shares.sum())
+    bucket = np.zeros(n, dtype=np.int64)
+    for i, a in enumerate(ARCHETYPES):
+        m = arch == i
+        p = np.array(a['buckets'])
+        bucket[m] = rng.choice(len(BUCKETS), m.sum(), p=p / p.sum())
+    home = np.column_stack([SPB[0] + rng.normal(0, 0.08, n), SPB[1] + rng.normal(0, 0.15, n)])
+    return dict(
+        arch=arch, bucket=bucket, home=home,
+        work=home + rng.normal(0, 0.03, (n, 2)),
+        city=CITY_NAMES[rng.integers(0, len(CITY_NAMES), n)],
+        salary_day=rng.integers(1, 29, n),
+        salary=np.round(rng.lognormal(11.3, 0.35, n), -2),
+    )
+
+
+def generate_batch(rng, hashes: np.ndarray, days: int, events_per_day: float, end, mcc_by_cat: dict) -> dict:
+    """
+    DataFrame'ы всех таблиц для пачки клиентов (колонки = колонки таблиц);
+    mcc_by_cat — код категории -> коды MCC из справочника (core/mcc.py).
+    """
+    n = len(hashes)
+    cl = _clients(rng, n)
+    day = np.datetime64(end, 'D') - np.arange(days, 0, -1).astype('timedelta64[D]')
+    weekday = (day.view('int64') + 3) % 7          # 1970-01-01 — четверг
+
+    # ---- cs: дом утром, работа в будни, выезды по выходным ----
+    ci, di = np.repeat(np.arange(n), days), np.tile(np.arange(days), n)
+    parts = [(ci, di, 8, cl['home'][ci])]
+    w = weekday[di] < 5
+    parts.append((ci[w], di[w], 14, cl['work'][ci[w]]))
+    v = (weekday[di] >= 5) & (rng.random(len(di)) < 0.3)
+    parts.append((ci[v], di[v], 19, HOTSPOTS[rng.integers(0, len(HOTSPOTS), v.sum())]))
+    cs_c = np.concatenate([p[0] for p in parts])
+    cs_d = np.concatenate([p[1] for p in parts])
+    cs_h = np.concatenate([np.full(len(p[0]), p[2]) for p in parts])
+    jitter = np.concatenate([np.full(len(p[0]), 0.003 if p[2] != 19 else 0.01) for p in parts])
+    geo = np.concatenate([p[3] for p in parts]) + rng.uniform(-1, 1, (len(cs_c), 2)) * jitter[:, None]
+    cs_ts = _ts(day[cs_d], cs_h, rng.integers(0, 41, len(cs_c)))
+    cs = pd.DataFrame({
+        'ac.client_hash': hashes[cs_c],
+        'eventaction': 'Login Success',
+        'geolatitude': geo[:, 0].round(6),
+        'geolongitude': geo[:, 1].round(6),
+        'dt': pd.Series(cs_ts).dt.tz_localize('Europe/Moscow'),
+        'date_part': day[cs_d],
+    })
+
+    # ---- c: зарплата раз в месяц + p2p ----
+    months = np.unique(day.astype('datetime64[M]'))
+    sal_day = months[:, None].astype('datetime64[D]') + (cl['salary_day'] - 1)[None, :].astype('timedelta64[D]')
+    sal_c = np.broadcast_to(np.arange(n), sal_day.shape)
+    ok = (sal_day >= day[0]) & (sal_day <= day[-1])
+    sal_c, sal_day = sal_c[ok], sal_day[ok]
+    sal_amt = np.round(cl['salary'][sal_c] * rng.uniform(0.95, 1.05, len(sal_c)), 2)
+    p2p_n = rng.poisson(max(days / 30.0, 0.1), n)
+    p2p_c = np.repeat(np.arange(n), p2p_n)
+    p2p_day = day[rng.integers(0, days, len(p2p_c))]
+    c_client = np.concatenate([sal_c, p2p_c])
+    c_day = np.concatenate([sal_day, p2p_day])
+    c_ts = _ts(c_day, 12, rng.integers(0, 60, len(c_day)))
+    is_sal = np.arange(len(c_client)) < len(sal_c)
+    c = pd.DataFrame({
+        'src': 'gen',
+        'ac.client_hash': hashes[c_client],
+        'c_txn_dt': c_ts,
+        'txn_cod_type_rk': np.where(is_sal, 100, 200),
+        'txn_cod_type_name': np.where(is_sal, 'ЗАРПЛАТА', 'Перевод'),
+        'c_txn_rub_amt': np.concatenate([sal_amt, np.round(rng.uniform(500, 8000, len(p2p_c)), 2)]),
+        'pmnt_payer_name': np.concatenate([
+            np.full(len(sal_c), 'ЗАРПЛАТА', dtype=object),
+            _pick(rng, ['P2P ПОЛУЧЕНИЕ', 'ПЕРЕВОД ОТ ДРУГА'], len(p2p_c)),
+        ]),
+        'day_part': c_day,
+    })
+
+    # ---- tr: карточные операции по MCC-миксу профиля ----
+    counts = rng.poisson(events_per_day, (n, days)).ravel()
+    tr_c = np.repeat(np.repeat(np.arange(n), days), counts)
+    tr_d = np.repeat(np.tile(np.arange(days), n), counts)
+    t = len(tr_c)
+    mcc = np.zeros(t, dtype=np.int64)
+    merch = np.empty(t, dtype=object)
+    arch = cl['arch'][tr_c]
+    for i, a in enumerate(ARCHETYPES):
+        rows = np.flatnonzero(arch == i)
+        cats, weights = zip(*a['mix'])
+        w_ = np.array(weights)
+        cat = rng.choice(len(cats), len(rows), p=w_ / w_.sum())
+        for j, name in enumerate(cats):
+            r = rows[cat == j]
+            mcc[r] = _pick(rng, mcc_by_cat[name], len(r))
+            merch[r] = _pick(rng, MERCH[name], len(r))
+    own_city = rng.random(t) < 0.85
+    tr = pd.DataFrame({
+        't_src': 'gen',
+        't_client_hash': hashes[tr_c],
+        't_evt_posted_dttm': _ts(day[tr_d], rng.integers(8, 23, t), rng.integers(0, 60, t)),
+        't_trx_city': np.where(own_city, cl['city'][tr_c], _pick(rng, CITIES, t)),
+        't_mcc_code': mcc,
+        't_trx_direction': np.where(rng.random(t) < 0.03, 'C', 'D'),
+        't_merchant_name': merch,
+        't_amt': np.round(np.clip(rng.lognormal(6.8, 0.9, t), 50, 100_000), 2),
+        'day_part': day[tr_d],
+    })
+
+    # ---- so: входы в СБОЛ + зачисления зарплаты (пара к c) ----
+    logins = rng.poisson(0.3, (n, days)).ravel()
+    so_c = np.repeat(np.repeat(np.arange(n), days), logins)
+    so_d = np.repeat(np.tile(np.arange(days), n), logins)
+    so_ts = np.concatenate([_ts(day[so_d], rng.integers(7, 23, len(so_c)), rng.integers(0, 60, len(so_c))),
+                            c_ts[is_sal]])
+    m, k = len(so_c), int(is_sal.sum())
+    so = pd.DataFrame({
+        'ac.client_hash': hashes[np.concatenate([so_c, sal_c])],
+        'erib_id': rng.integers(1_000_000, 9_999_999, m + k).astype(str),
+        'oper_rur_amt': np.concatenate([np.zeros(m), sal_amt]),
+        'login_type': np.concatenate([_pick(rng, ['WEB', 'MOBILE', 'MAPI'], m), np.full(k, 'web', dtype=object)]),
+        'oper_type': np.concatenate([np.full(m, 'LOGIN', dtype=object), np.full(k, 'credit', dtype=object)]),
+        'date_time_oper': so_ts,
+        'date_create': so_ts.astype('datetime64[D]'),
+        'date_time_create': so_ts,
+        'doc_type': np.concatenate([np.full(m, 'AUTH', dtype=object), np.full(k, 'Зарплата', dtype=object)]),
+        't.p2p_flg': 0,
+        'day_part': so_ts.astype('datetime64[D]'),
+    })
+
+    # ---- core_dog: один договор на клиента ----
+    b = cl['bucket']
+    lo, hi = np.array(BUCKET_DAYS).T
+    debt = np.where(b == 0, 0.0, np.round(rng.lognormal(11.5, 1.0, n), 2))
+    overdue_days = rng.integers(lo[b], hi[b] + 1)
+    dog = pd.DataFrame({
+        'ac_client_hash': hashes,
+        'debt_tot_os_rub_amt': debt,
+        'debt_tot_os_ccy_amt': debt,
+        'debt_overdue_bal_rub_amt': np.where(b == 0, 0.0, np.round(debt * rng.uniform(0.05, 0.6, n), 2)),
+        'overdue_duration_days': overdue_days,
+        'total_overdue_duration_days': overdue_days,
+        'overdue_bucket_id': np.array([i for i, _ in BUCKETS])[b],
+        'overdue_bucket_name': np.array([name for _, name in BUCKETS], dtype=object)[b],
+        'npl_nflag': (np.array([i for i, _ in BUCKETS])[b] >= 4).astype(np.int8),
+        'day_part': np.datetime64(end, 'D'),
+    })
+
+    city = pd.DataFrame({'ac_client_hash': hashes, 'city': cl['city']})
+    return {'cs': cs, 'c': c, 'tr': tr, 'so': so, 'dog': dog, 'city': city}
+
+
+def _city_is_table() -> bool:
+    with connection.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('cber_schema.clients_city')")
+        row = cur.fetchone()
+    return bool(row) and row[0] in ('r', 'p')
+
+
+def _load_batch(first: int, count: int, days: int, events_per_day: float, end, seed, with_city: bool) -> dict:
+    """Генерирует и заливает COPY одну пачку клиентов (в процессе пула)."""
+    rng = np.random.default_rng(seed)
+    hashes = np.arange(HASH_BASE + first, HASH_BASE + first + count, dtype=np.int64)
+    frames = generate_batch(rng, hashes, days, events_per_day, end, mcc_codes())
+    stats = {}
+    try:
+        for key, df in frames.items():
+            if key == 'city':
+                if not with_city:
+                    continue
+                table = 'cber_schema.clients_city'
+            else:
+                table = DATASETS[key]['table']
+            with transaction.atomic(), connection.cursor() as cur:
+                stats[key] = copy_frame(cur, table, df)
+    finally:
+        connections.close_all()
+    return stats
+
+
+class Command(BaseCommand):
+    help = "Синтетические данные для нагрузочных тестов (cs/c/tr/so/core_dog/clients_city) через COPY"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=10_000, help='Число клиентов')
+        parser.add_argument('--days', type=int, default=90, help='Глубина истории, дней')
+        parser.add_argument('--events-per-day', type=float, default=1.0,
+                            help='Среднее число карточных операций (tr) на клиента в день')
+        parser.add_argument('--processes', type=int, default=4, help='Процессов загрузки')
+        parser.add_argument('--batch', type=int, default=5_000, help='Клиентов в одной пачке')
+        parser.add_argument('--offset', type=int, default=0,
+                            help='Сдвиг номеров клиентов (чтобы догенерировать к уже созданным)')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--clear', action='store_true',
+                            help='Сначала удалить ранее сгенерированных клиентов (диапазон хэшей)')
+
+    def handle(self, *args, **opts):
+        n, days = opts['clients'], opts['days']
+        if n <= 0 or days <= 0:
+            raise CommandError("--clients и --days должны быть > 0")
+        end = timezone.localdate()
+        with_city = _city_is_table()
+        if not with_city:
+            self.stdout.write(self.style.WARNING("clients_city — не таблица (view), пропускаем."))
+
+        if opts['clear']:
+            self._clear(with_city)
+
+        offset, size = opts['offset'], max(1, opts['batch'])
+        batches = [(offset + i, min(size, n - i)) for i in range(0, n, size)]
+        seeds = np.random.SeedSequence(opts['seed']).spawn(len(batches))
+        totals = {}
+        started = time.monotonic()
+
+        connections.close_all()
+        workers = max(1, min(opts['processes'], len(batches)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [
+                pool.submit(_load_batch, first, count, days, opts['events_per_day'], end, seed, with_city)
+                for (first, count), seed in zip(batches, seeds)
+            ]
+            for done, fut in enumerate(as_completed(futures), 1):
+                for key, (rows, secs) in fut.result().items():
+                    r, s = totals.get(key, (0, 0.0))
+                    totals[key] = (r + rows, s + secs)
+                self.stdout.write(f"  пачка {done}/{len(batches)}")
+
+        with connection.cursor() as cur:
+            for key in totals:
+                table = 'cber_schema.clients_city' if key == 'city' else DATASETS[key]['table']
+                cur.execute(f'ANALYZE {table}')
+        # данные шли мимо ingest — производные таблицы пересчитываем сами
+        with transaction.atomic(), connection.cursor() as cur:
+            register_buckets(cur, 'core_dog')
+            refresh_snapshot(cur)
+            for name in ROLLUPS:
+                refresh_daily(cur, name)
+            relink(cur)
+            DataVersion.bump(cur)
+
+        for key, (rows, secs) in totals.items():
+            self.stdout.write(f"{key}: {rows} строк (COPY {rate_text(rows, secs)} на процесс)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: {n} клиентов × {days} дней за {time.monotonic() - started:.1f} с"
+        ))
+
+    def _clear(self, with_city: bool):
+        lo, hi = str(HASH_BASE), str(HASH_BASE + 10 ** 18 - 1)
+        targets = [(DATASETS[k]['table'], col) for k, col in HASH_COLUMNS.items()]
+        if with_city:
+            targets.append(('cber_schema.clients_city', 'ac_client_hash'))
+        with transaction.atomic(), connection.cursor() as cur:
+            for table, col in targets:
+                cur.execute(f'DELETE FROM {table} WHERE "{col}"::text BETWEEN %s AND %s', [lo, hi])
+                self.stdout.write(f"{table}: удалено {cur.rowcount}")
@@ -0,0 +1,77 @@
+# core/management/commands/ingest_worker.py
+import multiprocessing
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.ingest import claim_next_job, reap_stale_jobs, run_job
+
+#$ python manage.py ingest_worker --processes 2
+
+
+def _worker_loop(poll: float, once: bool):
+    """Цикл одного процесса: своё соединение с БД, задачи берутся через SKIP LOCKED."""
+    stop = {'flag': False}
+
+    def _stop(signum, frame):
+        stop['flag'] = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    while not stop['flag']:
+        job = claim_next_job()
+        if job is None:
+            if once:
+                break
+            time.sleep(poll)
+            continue
+        run_job(job)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Фоновая обработка загрузок из очереди ingest_job (без внешнего брокера)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Число процессов-обработчиков')
+        parser.add_argument('--poll', type=float, default=2.0, help='Пауза опроса очереди, с')
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и выйти')
+
+    def handle(self, *args, **opts):
+        n = max(1, opts['processes'])
+        # задачи, брошенные убитыми обработчиками, иначе остаются running навсегда
+        reaped = reap_stale_jobs()
+        if reaped:
+            self.stdout.write(self.style.WARNING(f"ingest_worker: {reaped} зависших задач помечено failed"))
+        # соединения родителя не должны переходить в дочерние процессы
+        connections.close_all()
+
+        if n == 1:
+            self.stdout.write(self.style.SUCCESS(f"ingest_worker: 1 процесс (pid {os.getpid()})"))
+            _worker_loop(opts['poll'], opts['once'])
+            return
+
+        procs = [
+            multiprocessing.Process(target=_worker_loop, args=(opts['poll'], opts['once']), name=f'ingest-{i}')
+            for i in range(n)
+        ]
+        for p in procs:
+            p.start()
+        self.stdout.write(self.style.SUCCESS(
+            f"ingest_worker: {n} процессов ({', '.join(str(p.pid) for p in procs)})"
+        ))
+
+        def _forward(signum, frame):
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+
+        signal.signal(signal.SIGTERM, _forward)
+        signal.signal(signal.SIGINT, _forward)
+        for p in procs:
+            p.join()
+        self.stdout.write(self.style.SUCCESS("ingest_worker: остановлен"))
@@ -0,0 +1,28 @@
+# core/management/commands/refresh_client_daily.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.client_daily import ROLLUPS, refresh_all
+from core.models import DataVersion
+
+#$ python manage.py refresh_client_daily
+
+
+class Command(BaseCommand):
+    help = "Полный пересчёт дневных агрегатов по клиентам (client_daily_income / _spend / _city / _category) из c и tr"
+
+    def handle(self, *args, **opts):
+        started = time.monotonic()
+        with transaction.atomic():
+            refresh_all()
+            with connection.cursor() as cur:
+                DataVersion.bump(cur)
+                counts = []
+                for name in ROLLUPS:
+                    cur.execute(f'SELECT count(*) FROM {name}')
+                    counts.append(f"{name}: {cur.fetchone()[0]}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{', '.join(counts)} строк за {time.monotonic() - started:.1f} с"
+        ))
@@ -0,0 +1,25 @@
+# core/management/commands/refresh_debt_snapshot.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.debt_snapshot import refresh_all
+from core.models import ClientDebtSnapshot, DataVersion
+
+#$ python manage.py refresh_debt_snapshot
+
+
+class Command(BaseCommand):
+    help = "Полный пересчёт client_debt_snapshot (лучшая запись core_dog на клиента + город)"
+
+    def handle(self, *args, **opts):
+        started = time.monotonic()
+        with transaction.atomic():
+            refresh_all()
+            with connection.cursor() as cur:
+                DataVersion.bump(cur)
+        self.stdout.write(self.style.SUCCESS(
+            f"client_debt_snapshot: {ClientDebtSnapshot.objects.count()} клиентов "
+            f"за {time.monotonic() - started:.1f} с"
+        ))
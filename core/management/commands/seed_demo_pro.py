@@ -6,21 +6,12 @@ from django.utils import timezone
 from django.db import transaction, connection
 from django.db.models import Q
 
+from core.mcc import mcc_codes
 from core.models import Dog, Tr, So  # Cs и C пишем сырым SQL; clients_city (view) не трогаем
 
 random.seed(7)
 
-# MCC и мерчанты
-MCC = {
-    'grocery':  [5411, 5499],
-    'coffee':   [5813],
-    'food':     [5814, 5812],
-    'ecom':     [5969],
-    'fuel':     [5541, 5542],
-    'pharmacy': [5912],
-    'transport':[4111, 4121],
-    'atm':      [6011],
-}
+# мерчанты по категориям; коды MCC категорий — из справочника (core/mcc.py)
 MERCH = {
     'grocery':  ['ПЯТЁРОЧКА','МАГНИТ','ВКУСВИЛЛ'],
     'coffee':   ['STARBUCKS','КОФЕ ХАУЗ'],
@@ -67,6 +58,7 @@ class Command(BaseCommand):
         # --- подготовка массивов id ---
         hs_int = [int(p['client_hash']) for p in PROFILES]
         hs_str = [str(p['client_hash']) for p in PROFILES]
+        mcc_by_cat = mcc_codes()
 
         # --- очистка данных для этих клиентов ---
         with connection.cursor() as cur:
@@ -167,7 +159,7 @@ class Command(BaseCommand):
             # ежедневные расходы
             for d in range(1, 91):
                 cat = random.choices(cats, weights=weights, k=1)[0]
-                mcc = rnd(MCC[cat]); name = rnd(MERCH[cat])
+                mcc = rnd(mcc_by_cat[cat]); name = rnd(MERCH[cat])
                 for _ in range(random.choice([0,1,1,2])):
                     amt = rub(random.randint(200, 6000))
                     Tr.objects.create(
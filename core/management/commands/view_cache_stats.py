@@ -0,0 +1,16 @@
+# core/management/commands/view_cache_stats.py
+from django.core.management.base import BaseCommand
+
+from core.cache import stats
+
+#$ python manage.py view_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Попадания/промахи кэша ответов по view (core/cache.py)"
+
+    def handle(self, *args, **opts):
+        for name, s in stats().items():
+            total = s['hit'] + s['miss']
+            ratio = f"{100 * s['hit'] / total:.1f}%" if total else '—'
+            self.stdout.write(f"{name:<20} hit={s['hit']:<8} miss={s['miss']:<8} hit_ratio={ratio}")
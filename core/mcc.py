@@ -0,0 +1,65 @@
+# core/mcc.py
+"""
+Справочник MCC: категория мерчанта (merchant_category: id, код, русская
+подпись) и её коды MCC (mcc_category). Раньше соответствие жило в трёх
+местах — MCC_TO_CAT карточки клиента, CASE ленты операций и MCC сидеров.
+
+Справочник крошечный и меняется только миграцией — читается одним
+запросом на процесс и дальше отдаётся из памяти. Группировки по категории
+(структура трат карточки) идут по целому category_id дневного агрегата
+client_daily_category, категория в нём разрешена при загрузке tr.
+"""
+from typing import Dict, List, NamedTuple, Optional
+
+from django.db import connection
+
+OTHER = 0  # MCC нет в справочнике
+
+
+class Category(NamedTuple):
+    id: int
+    code: str
+    label: str
+
+
+_cache = {'categories': None, 'by_mcc': None}
+
+
+def _load() -> None:
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT mc.id, mc.code, mc.label, m.mcc "
+            "FROM merchant_category AS mc LEFT JOIN mcc_category AS m ON m.category_id = mc.id "
+            "ORDER BY mc.id, m.mcc"
+        )
+        rows = cur.fetchall()
+    categories, by_mcc = {}, {}
+    for category_id, code, label, mcc in rows:
+        category = categories.setdefault(category_id, Category(category_id, code, label))
+        if mcc is not None:
+            by_mcc[mcc] = category
+    _cache['categories'], _cache['by_mcc'] = categories, by_mcc
+
+
+def categories() -> Dict[int, Category]:
+    """Категории по id."""
+    if _cache['categories'] is None:
+        _load()
+    return _cache['categories']
+
+
+def category_of(mcc) -> Optional[Category]:
+    """Категория кода MCC (None — кода нет в справочнике)."""
+    if _cache['by_mcc'] is None:
+        _load()
+    return _cache['by_mcc'].get(mcc)
+
+
+def mcc_codes() -> Dict[str, List[int]]:
+    """Код категории -> её коды MCC (для сидеров тестовых данных)."""
+    if _cache['by_mcc'] is None:
+        _load()
+    codes = {}
+    for mcc, category in _cache['by_mcc'].items():
+        codes.setdefault(category.code, []).append(mcc)
+    return codes
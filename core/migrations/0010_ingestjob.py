@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_alter_c_table_alter_clientcity_table_alter_cs_table_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='queued', max_length=16)),
+                ('clear', models.BooleanField(default=False)),
+                ('files', models.JSONField(default=dict)),
+                ('progress', models.JSONField(default=dict)),
+                ('messages', models.JSONField(default=list)),
+                ('error', models.TextField(blank=True, default='')),
+                ('worker_pid', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'ingest_job',
+                'indexes': [models.Index(fields=['status', 'id'], name='ingest_job_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='mode',
+            field=models.CharField(choices=[('append', 'Добавить'), ('clear', 'Очистить и загрузить'), ('replace_range', 'Заменить диапазон дат')], default='append', max_length=16),
+        ),
+    ]
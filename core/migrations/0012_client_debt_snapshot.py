@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:45
+
+from django.db import migrations, models
+
+
+# копия полного пересчёта core.debt_snapshot.refresh на момент миграции
+# (миграция не должна зависеть от того, как код снимка изменится дальше)
+FILL_SQL = """
+INSERT INTO client_debt_snapshot
+    (ac_client_hash, dog_id, debt_tot_os_rub_amt, overdue_bucket_name, npl_nflag, city, day_part, refreshed_at)
+SELECT DISTINCT ON (dog.ac_client_hash)
+    dog.ac_client_hash, dog.id, dog.debt_tot_os_rub_amt, dog.overdue_bucket_name, dog.npl_nflag,
+    {city}, dog.day_part, now()
+FROM core_dog AS dog
+WHERE dog.ac_client_hash IS NOT NULL
+ORDER BY dog.ac_client_hash, dog.debt_tot_os_rub_amt DESC, dog.id DESC
+"""
+CITY_SQL = ("(SELECT cc.city FROM cber_schema.clients_city AS cc "
+            "WHERE cc.ac_client_hash = dog.ac_client_hash ORDER BY cc.city LIMIT 1)")
+
+
+def fill_snapshot(apps, schema_editor):
+    # core_dog неуправляемая: в тестовой/пустой БД её может не быть
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cur:
+        cur.execute("SELECT to_regclass('core_dog') IS NOT NULL, "
+                    "to_regclass('cber_schema.clients_city') IS NOT NULL")
+        has_dog, has_city = cur.fetchone()
+        if has_dog:
+            cur.execute(FILL_SQL.format(city=CITY_SQL if has_city else 'NULL'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_ingestjob_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientDebtSnapshot',
+            fields=[
+                ('ac_client_hash', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('dog_id', models.BigIntegerField()),
+                ('debt_tot_os_rub_amt', models.DecimalField(decimal_places=2, max_digits=18, null=True)),
+                ('overdue_bucket_name', models.CharField(max_length=50, null=True)),
+                ('npl_nflag', models.BooleanField(null=True)),
+                ('city', models.CharField(max_length=100, null=True)),
+                ('day_part', models.DateField(null=True)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'client_debt_snapshot',
+                'indexes': [models.Index(fields=['debt_tot_os_rub_amt', 'dog_id'], name='snapshot_debt_idx'), models.Index(fields=['overdue_bucket_name'], name='snapshot_bucket_idx'), models.Index(fields=['city'], name='snapshot_city_idx')],
+            },
+        ),
+        migrations.RunPython(fill_snapshot, migrations.RunPython.noop),
+    ]
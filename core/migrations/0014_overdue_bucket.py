@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:54
+
+from django.db import migrations, models
+
+# ранги — как в прежнем CASE сортировки «по просрочке»
+BUCKETS = [('0', 0), ('1-30', 30), ('30-60', 60), ('60-90', 90), ('90-120', 120), ('120-180', 180), ('180+', 999)]
+
+
+def seed_buckets(apps, schema_editor):
+    OverdueBucket = apps.get_model('core', 'OverdueBucket')
+    OverdueBucket.objects.bulk_create([OverdueBucket(name=n, rank=r) for n, r in BUCKETS], ignore_conflicts=True)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cur:
+        cur.execute("SELECT to_regclass('core_dog') IS NOT NULL")
+        if cur.fetchone()[0]:
+            # бакеты, которые уже есть в данных, но не в списке выше
+            cur.execute("INSERT INTO overdue_bucket (name, rank) "
+                        "SELECT DISTINCT overdue_bucket_name, 0 FROM core_dog WHERE overdue_bucket_name IS NOT NULL "
+                        "ON CONFLICT (name) DO NOTHING")
+        cur.execute("UPDATE client_debt_snapshot AS s SET bucket_rank = ob.rank "
+                    "FROM overdue_bucket AS ob WHERE ob.name = s.overdue_bucket_name AND s.bucket_rank <> ob.rank")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueBucket',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('rank', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'overdue_bucket',
+                'ordering': ['rank', 'name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='clientdebtsnapshot',
+            name='bucket_rank',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='clientdebtsnapshot',
+            index=models.Index(fields=['bucket_rank', 'dog_id'], name='snapshot_rank_idx'),
+        ),
+        migrations.RunPython(seed_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:02
+
+from django.db import migrations, models
+
+
+# копия полного пересчёта core.client_daily на момент миграции
+FILL_SQL = {
+    'c': ["""
+        INSERT INTO client_daily_income (ac_client_hash, day, day_part, inc_sum, inc_count)
+        SELECT c."ac.client_hash", DATE(c.c_txn_dt), c.day_part, SUM(c.c_txn_rub_amt), count(*)
+        FROM c AS c
+        WHERE c.c_txn_rub_amt > 0 AND c."ac.client_hash" IS NOT NULL
+          AND c.c_txn_dt IS NOT NULL AND c.day_part IS NOT NULL
+        GROUP BY 1, 2, 3
+    """],
+    'tr': ["""
+        INSERT INTO client_daily_spend
+            (ac_client_hash, day, day_part, spend_sum, spend_count, atm_sum, geo_total, geo_with_city)
+        SELECT t.t_client_hash, DATE(t.t_evt_posted_dttm), t.day_part,
+               COALESCE(SUM(t.t_amt) FILTER (WHERE t.t_amt > 0), 0),
+               count(*) FILTER (WHERE t.t_amt > 0),
+               COALESCE(SUM(t.t_amt) FILTER (WHERE t.t_amt > 0 AND t.t_merchant_name ILIKE '%ATM%'), 0),
+               count(*),
+               count(*) FILTER (WHERE t.t_trx_city IS NOT NULL AND t.t_trx_city NOT IN ('', '—'))
+        FROM tr AS t
+        WHERE t.t_trx_direction = 'D' AND t.t_client_hash IS NOT NULL
+          AND t.t_evt_posted_dttm IS NOT NULL AND t.day_part IS NOT NULL
+        GROUP BY 1, 2, 3
+    """, """
+        INSERT INTO client_daily_city (ac_client_hash, day, day_part, city, spend_sum)
+        SELECT t.t_client_hash, DATE(t.t_evt_posted_dttm), t.day_part, t.t_trx_city, SUM(t.t_amt)
+        FROM tr AS t
+        WHERE t.t_trx_direction = 'D' AND t.t_amt > 0 AND t.t_client_hash IS NOT NULL
+          AND t.t_evt_posted_dttm IS NOT NULL AND t.day_part IS NOT NULL
+          AND t.t_trx_city IS NOT NULL AND t.t_trx_city NOT IN ('', '—')
+        GROUP BY 1, 2, 3, 4
+    """],
+}
+
+
+def fill_daily(apps, schema_editor):
+    # c / tr неуправляемые: в тестовой/пустой БД их может не быть
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cur:
+        for table, statements in FILL_SQL.items():
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+            if cur.fetchone()[0]:
+                for sql in statements:
+                    cur.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_overdue_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientDailyCity',
+            fields=[
+                ('pk', models.CompositePrimaryKey('ac_client_hash', 'day', 'day_part', 'city', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('ac_client_hash', models.CharField(max_length=50)),
+                ('day', models.DateField()),
+                ('day_part', models.DateField()),
+                ('city', models.CharField(max_length=100)),
+                ('spend_sum', models.DecimalField(decimal_places=4, max_digits=18)),
+            ],
+            options={
+                'db_table': 'client_daily_city',
+                'indexes': [models.Index(fields=['day_part'], name='daily_city_part_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClientDailyIncome',
+            fields=[
+                ('pk', models.CompositePrimaryKey('ac_client_hash', 'day', 'day_part', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('ac_client_hash', models.CharField(max_length=50)),
+                ('day', models.DateField()),
+                ('day_part', models.DateField()),
+                ('inc_sum', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('inc_count', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'client_daily_income',
+                'indexes': [models.Index(fields=['day_part'], name='daily_income_part_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClientDailySpend',
+            fields=[
+                ('pk', models.CompositePrimaryKey('ac_client_hash', 'day', 'day_part', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('ac_client_hash', models.CharField(max_length=50)),
+                ('day', models.DateField()),
+                ('day_part', models.DateField()),
+                ('spend_sum', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('spend_count', models.IntegerField()),
+                ('atm_sum', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('geo_total', models.IntegerField()),
+                ('geo_with_city', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'client_daily_spend',
+                'indexes': [models.Index(fields=['day_part'], name='daily_spend_part_idx')],
+            },
+        ),
+        migrations.RunPython(fill_daily, migrations.RunPython.noop),
+    ]
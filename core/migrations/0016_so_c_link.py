@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# копия полного пересчёта core.so_link.relink на момент миграции
+FILL_SQL = """
+INSERT INTO so_c_link (c_id, so_id, ac_client_hash, day, c_day_part, so_day_part, date_time_oper, doc_type)
+SELECT DISTINCT ON (c.id)
+    c.id, so.id, c."ac.client_hash", DATE(c.c_txn_dt), c.day_part, so.day_part, so.date_time_oper, so.doc_type
+FROM c AS c
+JOIN so AS so
+  ON so."ac.client_hash" = c."ac.client_hash"
+ AND so.oper_rur_amt = c.c_txn_rub_amt
+ AND DATE(so.date_time_oper) = DATE(c.c_txn_dt)
+WHERE c.c_txn_rub_amt > 0
+ORDER BY c.id, so.date_time_oper, so.id
+"""
+
+
+def fill_link(apps, schema_editor):
+    # c / so неуправляемые: в тестовой/пустой БД их может не быть
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cur:
+        cur.execute("SELECT to_regclass('c') IS NOT NULL AND to_regclass('so') IS NOT NULL")
+        if cur.fetchone()[0]:
+            cur.execute(FILL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_client_daily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoCLink',
+            fields=[
+                ('c', models.OneToOneField(db_column='c_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='so_link', serialize=False, to='core.c')),
+                ('ac_client_hash', models.CharField(max_length=50)),
+                ('day', models.DateField()),
+                ('c_day_part', models.DateField(null=True)),
+                ('so_day_part', models.DateField(null=True)),
+                ('date_time_oper', models.DateTimeField()),
+                ('doc_type', models.CharField(max_length=50, null=True)),
+                ('so', models.ForeignKey(db_column='so_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='c_links', to='core.so')),
+            ],
+            options={
+                'db_table': 'so_c_link',
+                'indexes': [models.Index(fields=['ac_client_hash', 'day'], name='so_c_link_client_day_idx'), models.Index(fields=['c_day_part'], name='so_c_link_c_part_idx'), models.Index(fields=['so_day_part'], name='so_c_link_so_part_idx')],
+            },
+        ),
+        migrations.RunPython(fill_link, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# категории и коды — как в прежних MCC_TO_CAT / CATEGORY_RU (views_clients) и CASE ленты
+CATEGORIES = [
+    (0, 'other', 'прочее'),
+    (1, 'grocery', 'продукты'),
+    (2, 'coffee', 'кофейня'),
+    (3, 'food', 'еда'),
+    (4, 'fastfood', 'фастфуд'),
+    (5, 'restaurant', 'ресторан'),
+    (6, 'ecom', 'онлайн'),
+    (7, 'fuel', 'топливо'),
+    (8, 'pharmacy', 'аптека'),
+    (9, 'transport', 'транспорт'),
+    (10, 'entertainment', 'развлечения'),
+    (11, 'atm', 'банкомат'),
+    (12, 'p2p', 'перевод'),
+]
+MCC = {
+    5411: 'grocery', 5499: 'grocery',
+    5813: 'coffee',
+    5814: 'food', 5812: 'food',
+    5969: 'ecom', 4816: 'ecom',
+    5541: 'fuel', 5542: 'fuel',
+    5912: 'pharmacy',
+    4111: 'transport', 4121: 'transport',
+    6010: 'atm', 6011: 'atm',
+}
+
+# копия полного пересчёта client_daily_category (core.client_daily) на момент миграции
+FILL_SQL = """
+INSERT INTO client_daily_category (ac_client_hash, day, day_part, category_id, spend_sum, spend_count)
+SELECT t.t_client_hash, DATE(t.t_evt_posted_dttm), t.day_part, COALESCE(m.category_id, 0),
+       SUM(t.t_amt), count(*)
+FROM tr AS t
+LEFT JOIN mcc_category AS m ON m.mcc = t.t_mcc_code
+WHERE t.t_trx_direction = 'D' AND t.t_amt > 0 AND t.t_client_hash IS NOT NULL
+  AND t.t_evt_posted_dttm IS NOT NULL AND t.day_part IS NOT NULL
+GROUP BY 1, 2, 3, 4
+"""
+
+
+def seed_mcc(apps, schema_editor):
+    MerchantCategory = apps.get_model('core', 'MerchantCategory')
+    MccCategory = apps.get_model('core', 'MccCategory')
+    MerchantCategory.objects.bulk_create([MerchantCategory(id=i, code=code, label=label)
+                                          for i, code, label in CATEGORIES], ignore_conflicts=True)
+    ids = {code: i for i, code, _ in CATEGORIES}
+    MccCategory.objects.bulk_create([MccCategory(mcc=mcc, category_id=ids[code]) for mcc, code in MCC.items()],
+                                    ignore_conflicts=True)
+    # tr неуправляемая: в тестовой/пустой БД её может не быть
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cur:
+        cur.execute("SELECT to_regclass('tr') IS NOT NULL")
+        if cur.fetchone()[0]:
+            cur.execute(FILL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_so_c_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MerchantCategory',
+            fields=[
+                ('id', models.SmallIntegerField(primary_key=True, serialize=False)),
+                ('code', models.CharField(max_length=32, unique=True)),
+                ('label', models.CharField(max_length=64)),
+            ],
+            options={
+                'db_table': 'merchant_category',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClientDailyCategory',
+            fields=[
+                ('pk', models.CompositePrimaryKey('ac_client_hash', 'day', 'day_part', 'category_id', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('ac_client_hash', models.CharField(max_length=50)),
+                ('day', models.DateField()),
+                ('day_part', models.DateField()),
+                ('category_id', models.SmallIntegerField()),
+                ('spend_sum', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('spend_count', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'client_daily_category',
+                'indexes': [models.Index(fields=['day_part'], name='daily_category_part_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MccCategory',
+            fields=[
+                ('mcc', models.IntegerField(primary_key=True, serialize=False)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='mccs', to='core.merchantcategory')),
+            ],
+            options={
+                'db_table': 'mcc_category',
+                'ordering': ['mcc'],
+            },
+        ),
+        migrations.RunPython(seed_mcc, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_mcc_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='worker_host',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
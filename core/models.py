@@ -1,4 +1,6 @@
-from django.db import models
+import json
+
+from django.db import connection, models
 
 # 1) cs
 class Cs(models.Model):
@@ -113,3 +115,236 @@ class ClientCity(models.Model):
         managed = False
 
 
+
+# 7) очередь фоновых загрузок (upload_multi_page -> ingest_worker)
+class IngestJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    # режим загрузки: дописать / очистить таблицы / заменить диапазон day_part из файла
+    APPEND = 'append'
+    CLEAR = 'clear'
+    REPLACE_RANGE = 'replace_range'
+    MODE_CHOICES = [
+        (APPEND, 'Добавить'),
+        (CLEAR, 'Очистить и загрузить'),
+        (REPLACE_RANGE, 'Заменить диапазон дат'),
+    ]
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    clear = models.BooleanField(default=False)
+    mode = models.CharField(max_length=16, choices=MODE_CHOICES, default=APPEND)
+    # {'tr': 'uploads/<uuid>/tr.xlsx', ...} — пути относительно MEDIA_ROOT
+    files = models.JSONField(default=dict)
+    # {'tr': {'state', 'parsed', 'inserted', 'rejected', 'elapsed'}, ...}
+    progress = models.JSONField(default=dict)
+    messages = models.JSONField(default=list)
+    error = models.TextField(blank=True, default='')
+    worker_pid = models.IntegerField(null=True, blank=True)
+    # хост обработчика: живость worker_pid проверяется только на том же хосте (reap_stale_jobs)
+    worker_host = models.CharField(max_length=255, blank=True, default='')
+    # последняя отметка живого обработчика: взятие задачи и каждый отчёт о прогрессе
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'ingest_job'
+        indexes = [models.Index(fields=['status', 'id'], name='ingest_job_status_idx')]
+
+    def update_progress(self, key: str, fields: dict):
+        """
+        Атомарно сливает fields в progress[key] (jsonb ||), без гонок между
+        процессами; заодно обновляет heartbeat_at.
+        """
+        with connection.cursor() as cur:
+            cur.execute(
+                "UPDATE ingest_job SET progress = jsonb_set(progress, %s, "
+                "COALESCE(progress -> %s, '{}'::jsonb) || %s::jsonb, true), "
+                "heartbeat_at = CURRENT_TIMESTAMP WHERE id = %s",
+                [[key], key, json.dumps(fields), self.pk],
+            )
+
+
+# 8) снимок «лучшая запись долга на клиента» для списков клиентов
+#    (обновляется после загрузки dog, см. core/debt_snapshot.py)
+class ClientDebtSnapshot(models.Model):
+    ac_client_hash = models.BigIntegerField(primary_key=True)
+    dog_id = models.BigIntegerField()
+    debt_tot_os_rub_amt = models.DecimalField(max_digits=18, decimal_places=2, null=True)
+    overdue_bucket_name = models.CharField(max_length=50, null=True)
+    npl_nflag = models.BooleanField(null=True)
+    # ранг бакета из справочника overdue_bucket — сортировка «по просрочке» идёт по индексу
+    bucket_rank = models.IntegerField(default=0)
+    city = models.CharField(max_length=100, null=True)
+    day_part = models.DateField(null=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'client_debt_snapshot'
+        indexes = [
+            models.Index(fields=['debt_tot_os_rub_amt', 'dog_id'], name='snapshot_debt_idx'),
+            models.Index(fields=['overdue_bucket_name'], name='snapshot_bucket_idx'),
+            models.Index(fields=['bucket_rank', 'dog_id'], name='snapshot_rank_idx'),
+            models.Index(fields=['city'], name='snapshot_city_idx'),
+        ]
+
+
+# 9) поколение данных: +1 при каждой публикации загрузки (в той же транзакции).
+#    Кэши производных значений (счётчики списков) держат его в ключе.
+class DataVersion(models.Model):
+    INGEST = 'ingest'
+
+    name = models.CharField(max_length=32, primary_key=True)
+    generation = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'data_version'
+
+    @classmethod
+    def bump(cls, cur, name: str = INGEST) -> None:
+        cur.execute(
+            "INSERT INTO data_version (name, generation, updated_at) VALUES (%s, 1, CURRENT_TIMESTAMP) "
+            "ON CONFLICT (name) DO UPDATE SET generation = data_version.generation + 1, "
+            "updated_at = CURRENT_TIMESTAMP",
+            [name],
+        )
+
+    @classmethod
+    def current(cls, name: str = INGEST) -> int:
+        return cls.objects.filter(name=name).values_list('generation', flat=True).first() or 0
+
+
+# 10) справочник бакетов просрочки: порядок для сортировки «по просрочке»
+#    и список для фильтра (core/buckets.py). Незнакомые бакеты из загрузки
+#    dog добавляются с рангом 0; после смены ранга — refresh_debt_snapshot.
+class OverdueBucket(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    rank = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'overdue_bucket'
+        ordering = ['rank', 'name']
+
+    def __str__(self):
+        return self.name
+
+
+# 11) дневные агрегаты по клиенту для карточки клиента (core/client_daily.py):
+#     строки c/tr свёрнуты до (клиент, дата операции, day_part). day_part в
+#     ключе — чтобы replace_range пересчитывал ровно заменённый диапазон.
+class ClientDailyIncome(models.Model):
+    pk = models.CompositePrimaryKey('ac_client_hash', 'day', 'day_part')
+    ac_client_hash = models.CharField(max_length=50)
+    day = models.DateField()
+    day_part = models.DateField()
+    inc_sum = models.DecimalField(max_digits=18, decimal_places=2)
+    inc_count = models.IntegerField()
+
+    class Meta:
+        db_table = 'client_daily_income'
+        indexes = [models.Index(fields=['day_part'], name='daily_income_part_idx')]
+
+
+class ClientDailySpend(models.Model):
+    # только списания (D): суммы — по amt > 0, гео — по всем списаниям
+    pk = models.CompositePrimaryKey('ac_client_hash', 'day', 'day_part')
+    ac_client_hash = models.CharField(max_length=50)
+    day = models.DateField()
+    day_part = models.DateField()
+    spend_sum = models.DecimalField(max_digits=18, decimal_places=4)
+    spend_count = models.IntegerField()
+    atm_sum = models.DecimalField(max_digits=18, decimal_places=4)
+    geo_total = models.IntegerField()
+    geo_with_city = models.IntegerField()
+
+    class Meta:
+        db_table = 'client_daily_spend'
+        indexes = [models.Index(fields=['day_part'], name='daily_spend_part_idx')]
+
+
+class ClientDailyCity(models.Model):
+    pk = models.CompositePrimaryKey('ac_client_hash', 'day', 'day_part', 'city')
+    ac_client_hash = models.CharField(max_length=50)
+    day = models.DateField()
+    day_part = models.DateField()
+    city = models.CharField(max_length=100)
+    spend_sum = models.DecimalField(max_digits=18, decimal_places=4)
+
+    class Meta:
+        db_table = 'client_daily_city'
+        indexes = [models.Index(fields=['day_part'], name='daily_city_part_idx')]
+
+
+class ClientDailyCategory(models.Model):
+    # категория — из справочника MCC при загрузке (0 — MCC нет в справочнике)
+    pk = models.CompositePrimaryKey('ac_client_hash', 'day', 'day_part', 'category_id')
+    ac_client_hash = models.CharField(max_length=50)
+    day = models.DateField()
+    day_part = models.DateField()
+    category_id = models.SmallIntegerField()
+    spend_sum = models.DecimalField(max_digits=18, decimal_places=4)
+    spend_count = models.IntegerField()
+
+    class Meta:
+        db_table = 'client_daily_category'
+        indexes = [models.Index(fields=['day_part'], name='daily_category_part_idx')]
+
+
+# 12) сопоставление So ↔ C (core/so_link.py): для строки поступления c —
+#     первая операция so того же клиента, суммы и дня. Считается при загрузке
+#     c / so, карточка клиента берёт время и тип документа соединением по c_id.
+class SoCLink(models.Model):
+    c = models.OneToOneField(C, primary_key=True, on_delete=models.DO_NOTHING, db_constraint=False,
+                             related_name='so_link', db_column='c_id')
+    so = models.ForeignKey(So, on_delete=models.DO_NOTHING, db_constraint=False,
+                           related_name='c_links', db_column='so_id')
+    ac_client_hash = models.CharField(max_length=50)
+    day = models.DateField()
+    c_day_part = models.DateField(null=True)
+    so_day_part = models.DateField(null=True)
+    date_time_oper = models.DateTimeField()
+    doc_type = models.CharField(max_length=50, null=True)
+
+    class Meta:
+        db_table = 'so_c_link'
+        indexes = [
+            models.Index(fields=['ac_client_hash', 'day'], name='so_c_link_client_day_idx'),
+            models.Index(fields=['c_day_part'], name='so_c_link_c_part_idx'),
+            models.Index(fields=['so_day_part'], name='so_c_link_so_part_idx'),
+        ]
+
+
+# 13) справочник MCC (core/mcc.py): категория мерчанта с русской подписью и
+#     её коды MCC. Категория карточной операции разрешается при загрузке tr
+#     (client_daily_category); после правки справочника — refresh_client_daily.
+class MerchantCategory(models.Model):
+    id = models.SmallIntegerField(primary_key=True)
+    code = models.CharField(max_length=32, unique=True)
+    label = models.CharField(max_length=64)
+
+    class Meta:
+        db_table = 'merchant_category'
+        ordering = ['id']
+
+    def __str__(self):
+        return self.label
+
+
+class MccCategory(models.Model):
+    mcc = models.IntegerField(primary_key=True)
+    category = models.ForeignKey(MerchantCategory, on_delete=models.PROTECT, related_name='mccs')
+
+    class Meta:
+        db_table = 'mcc_category'
+        ordering = ['mcc']
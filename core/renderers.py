@@ -0,0 +1,39 @@
+# core/renderers.py
+"""
+Быстрый JSON-рендерер для DRF: orjson (в разы быстрее json + DjangoJSONEncoder
+на больших страницах). Decimal — строкой, как DecimalField DRF по умолчанию.
+Без orjson в окружении — обычный json.
+"""
+import json
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson опционален
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return f'{value:f}'
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from core.models import Dog
+from core.models import ClientDebtSnapshot
 
 class ClientDebtSerializer(serializers.ModelSerializer):
     client_id = serializers.CharField(source='ac_client_hash')
@@ -7,5 +7,48 @@ class ClientDebtSerializer(serializers.ModelSerializer):
     overdue_bucket = serializers.CharField(source='overdue_bucket_name')
 
     class Meta:
-        model = Dog
+        model = ClientDebtSnapshot
         fields = ('client_id', 'total_debt', 'overdue_bucket', 'npl_nflag')
+
+
+# Быстрый путь ClientsListAPI: кортежи values_list -> dict без сериализатора.
+# Поле ответа, колонка снимка, преобразование — те же, что у ClientDebtSerializer.
+def _text(v):
+    return None if v is None else str(v)
+
+
+# само поле сериализатора: те же два знака и то же округление (по контексту decimal — HALF_EVEN)
+_TOTAL_DEBT = ClientDebtSerializer._declared_fields['total_debt']
+
+
+def _decimal_text(v):
+    return None if v is None else _TOTAL_DEBT.to_representation(v)
+
+
+def _same(v):
+    return v
+
+
+CLIENT_DEBT_FIELDS = (
+    ('client_id', 'ac_client_hash', _text),
+    ('total_debt', 'debt_tot_os_rub_amt', _decimal_text),
+    ('overdue_bucket', 'overdue_bucket_name', _text),
+    ('npl_nflag', 'npl_nflag', _same),
+)
+CLIENT_DEBT_COLUMNS = tuple(column for _, column, _ in CLIENT_DEBT_FIELDS)
+
+
+def compile_row_mapper(fields):
+    """Функция кортеж -> dict, собранная один раз: ключи и преобразования связаны заранее."""
+    keys = tuple(key for key, _, _ in fields)
+    converters = tuple(convert for _, _, convert in fields)
+
+    def to_dict(row):
+        # zip обрезает хвост кортежа (поля сортировки, добавленные page_clients)
+        return {k: f(v) for k, f, v in zip(keys, converters, row)}
+
+    return to_dict
+
+
+client_debt_row = compile_row_mapper(CLIENT_DEBT_FIELDS)
+
@@ -0,0 +1,87 @@
+# core/so_link.py
+"""
+Связь So ↔ C (so_c_link): для каждого поступления c (сумма > 0) — первая по
+времени операция so того же клиента с той же суммой в тот же день. Раньше
+карточка клиента искала её двумя коррелированными подзапросами на строку c
+(по DATE(date_time_oper) — мимо индекса); теперь сопоставление делается при
+загрузке одним соединением по (клиент, сумма, день), карточка и отчёты
+сверки соединяются со связью по c_id / so_id.
+
+Пересчёт — по парам (клиент, день), которые затронула публикация c или so
+(ingest_spec: after_publish, в той же транзакции); clear — полный пересчёт.
+Вручную: python manage.py refresh_so_link.
+"""
+from django.db import connection
+
+from .models import IngestJob
+
+LINK = 'so_c_link'
+
+# {pairs_join} — только затронутые пары (so_c_link_pairs); без него — все строки
+_LINK_SQL = """
+INSERT INTO so_c_link (c_id, so_id, ac_client_hash, day, c_day_part, so_day_part, date_time_oper, doc_type)
+SELECT DISTINCT ON (c.id)
+    c.id, so.id, c."ac.client_hash", DATE(c.c_txn_dt), c.day_part, so.day_part, so.date_time_oper, so.doc_type
+FROM c AS c {pairs_join}
+JOIN so AS so
+  ON so."ac.client_hash" = c."ac.client_hash"
+ AND so.oper_rur_amt = c.c_txn_rub_amt
+ AND DATE(so.date_time_oper) = DATE(c.c_txn_dt) {so_scope}
+WHERE c.c_txn_rub_amt > 0
+ORDER BY c.id, so.date_time_oper, so.id
+"""
+
+# по парам: границы дня — отдельными условиями, чтобы шли по индексам (клиент, время) c и so
+_PAIRS_JOIN = """
+JOIN so_c_link_pairs AS p
+  ON c."ac.client_hash" = p.ac_client_hash AND c.c_txn_dt >= p.day AND c.c_txn_dt < p.day + 1"""
+_SO_SCOPE = "AND so.date_time_oper >= p.day AND so.date_time_oper < p.day + 1"
+
+
+def relink(cur, pairs_sql: str = None, params=()) -> None:
+    """
+    Пересчитывает связи. pairs_sql — подзапрос с двумя колонками
+    (ac_client_hash, day); без него — полный пересчёт.
+    """
+    # c и so публикуются в разных процессах пула: пересчёты идут по очереди до коммита,
+    # иначе каждый не видит незакоммиченную половину пары (или оба вставляют одну связь)
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('so_c_link'))")
+    if not pairs_sql:
+        cur.execute(f'DELETE FROM {LINK}')
+        cur.execute(_LINK_SQL.format(pairs_join='', so_scope=''))
+        return
+    # пары считаются до удаления связей: подзапрос может читать сам so_c_link
+    cur.execute('DROP TABLE IF EXISTS so_c_link_pairs')
+    cur.execute(f'CREATE TEMP TABLE so_c_link_pairs ON COMMIT DROP AS '
+                f'SELECT DISTINCT * FROM ({pairs_sql}) AS p0 (ac_client_hash, day)', list(params))
+    cur.execute(f'DELETE FROM {LINK} AS l USING so_c_link_pairs AS p '
+                f'WHERE l.ac_client_hash = p.ac_client_hash AND l.day = p.day')
+    cur.execute(_LINK_SQL.format(pairs_join=_PAIRS_JOIN, so_scope=_SO_SCOPE))
+
+
+def _after_publish(cur, stage, lo, hi, dt_col: str, part_col: str) -> None:
+    if stage.mode == IngestJob.CLEAR:
+        relink(cur)
+        return
+    pairs = f'SELECT "ac.client_hash", DATE({dt_col}) FROM {stage.name}'
+    params = []
+    if stage.mode == IngestJob.REPLACE_RANGE:
+        # связи удалённых строк диапазона — их пары тоже пересчитываются
+        pairs += f' UNION SELECT ac_client_hash, day FROM {LINK} WHERE {part_col} BETWEEN %s AND %s'
+        params = [lo, hi]
+    relink(cur, pairs, params)
+
+
+def refresh_all() -> None:
+    with connection.cursor() as cur:
+        relink(cur)
+
+
+# -------------------- хуки публикации загрузки (ingest_spec) --------------------
+
+def relink_after_c_publish(cur, stage, lo=None, hi=None) -> None:
+    _after_publish(cur, stage, lo, hi, 'c_txn_dt', 'c_day_part')
+
+
+def relink_after_so_publish(cur, stage, lo=None, hi=None) -> None:
+    _after_publish(cur, stage, lo, hi, 'date_time_oper', 'so_day_part')
@@ -1,3 +1,912 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_right
+from io import BytesIO
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.http import QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import cache as view_cache, cities, client_daily, clients_export, debt_snapshot, mcc, so_link
+from core.client_feed import feed_page
+from core.clients_count import clients_count
+from core.clients_facets import DEBT_BIN_EDGES, client_facets
+from core.clients_query import (
+    ORDERINGS, InvalidCursor, client_filters, filtered_clients, order_clients, page_clients,
+)
+from core.db_indexes import HOT_TABLES, INDEXES, ensure, seq_scans, state
+from core.geo_features import load_events_qs
+from core.ingest import prepare_frame, reap_stale_jobs, run_job
+from core.ingest_readers import iter_chunks
+from core.ingest_spec import DATASETS
+from core.ingest_stage import Stage
+from core.models import (
+    C, ClientCity, ClientDailyIncome, ClientDebtSnapshot, Cs, DataVersion, Dog, IngestJob, So, SoCLink, Tr,
+)
+from core.serializers import CLIENT_DEBT_COLUMNS, ClientDebtSerializer, client_debt_row
+from core.views_clients import client_detail_view
+from core.views_geo import HeatmapAPI
+from core.views_geo_homework import HomeWorkAPI
+
+CLIENT = 7000000000000000001
+CLIENTS = [CLIENT + i for i in range(40)]
+
+# client_detail_view: dog, город, последние поступления, лента операций (client_feed),
+# дневные агрегаты и проход по строкам (client_kpis)
+CLIENT_DETAIL_QUERY_BUDGET = 6
+# кэш тестов — в памяти процесса: файловый кэш пережил бы тестовую БД с её поколениями
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}}
+
+
+# снимок для списков клиентов: NULL-долги, равные долги и ранги, пустые бакеты/города
+SNAPSHOT_BUCKETS = [('0', 0), ('1-30', 30), ('30-60', 60), (None, 0)]
+SNAPSHOT_CITIES = ['Москва', 'Казань', None]
+
+
+def seed_snapshot(n=23):
+    rows = []
+    for i in range(n):
+        bucket, rank = SNAPSHOT_BUCKETS[i % len(SNAPSHOT_BUCKETS)]
+        rows.append(ClientDebtSnapshot(
+            ac_client_hash=9_000_000_000_000_000 + i, dog_id=1000 + i,
+            debt_tot_os_rub_amt=None if i % 5 == 0 else Decimal(2500 * (i % 4)) + Decimal('0.25'),
+            overdue_bucket_name=bucket, bucket_rank=rank, npl_nflag=i % 3 == 0,
+            city=SNAPSHOT_CITIES[i % len(SNAPSHOT_CITIES)], day_part=date(2025, 1, 1),
+        ))
+    # список городов держится в памяти по поколению, а оно в каждой тестовой БД начинается с 0
+    cities._cache['generation'] = None
+    return ClientDebtSnapshot.objects.bulk_create(rows)
+
+
+def expected_order(rows, ordering):
+    """Порядок списка по ORDERINGS, посчитанный в Python: NULL — больше всех."""
+    (first, *_), desc = ORDERINGS[ordering], ORDERINGS[ordering][0].startswith('-')
+    name = first.lstrip('-')
+    key = lambda r: (getattr(r, name) is None, getattr(r, name) or 0, r.dog_id)
+    return [r.ac_client_hash for r in sorted(rows, key=key, reverse=desc)]
+
+
+def seed_client_tables():
+    """Неуправляемые таблицы + индексы + 40 клиентов с c/tr/so/cs/dog (только PostgreSQL)."""
+    # неуправляемые таблицы в тестовой БД не создаются миграциями
+    with connection.schema_editor() as editor:
+        for model in (Cs, C, Tr, So, Dog, ClientCity):
+            editor.create_model(model)
+    with connection.cursor() as cur:
+        for ix in INDEXES:
+            ensure(cur, ix, concurrently=False)
+
+    start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    dogs, cs, c, tr, so = [], [], [], [], []
+    for n, client in enumerate(CLIENTS):
+        dogs += [Dog(ac_client_hash=client, debt_tot_os_rub_amt=Decimal(1000 * k + n),
+                     overdue_bucket_name='1-30', npl_nflag=False, day_part=date(2025, 1, 1))
+                 for k in range(3)]
+        for k in range(20):
+            dt = start + timedelta(hours=7 * k + n)
+            cs.append(Cs(ac_client_hash=str(client), eventaction='Login Success',
+                         geolatitude=55.7 + k / 1000, geolongitude=37.6, dt=dt, date_part=dt.date()))
+            c.append(C(src='c', ac_client_hash=str(client), c_txn_dt=dt, txn_cod_type_rk=1,
+                       txn_cod_type_name='Зачисление', c_txn_rub_amt=Decimal(100 + k),
+                       pmnt_payer_name='ООО Ромашка', day_part=dt.date()))
+            tr.append(Tr(src='tr', ac_client_hash=str(client), c_txn_dt=dt, t_trx_city='Москва',
+                         txn_cod_type_rk=5411, t_trx_direction='D', t_merchant_name='Магазин',
+                         c_txn_rub_amt=Decimal(50 + k), day_part=dt.date()))
+            so.append(So(ac_client_hash=str(client), erib_id='e', oper_rur_amt=Decimal(100 + k),
+                         login_type='l', oper_type='o', date_time_oper=dt, date_create=dt.date(),
+                         date_time_create=dt, doc_type='d', t_p2p_flg=False, day_part=dt.date()))
+    Dog.objects.bulk_create(dogs)
+    Cs.objects.bulk_create(cs)
+    C.objects.bulk_create(c)
+    Tr.objects.bulk_create(tr)
+    So.objects.bulk_create(so)
+    ClientCity.objects.bulk_create([ClientCity(ac_client_hash=h, city='Москва') for h in CLIENTS])
+    client_daily.refresh_all()
+    so_link.refresh_all()
+    with connection.cursor() as cur:
+        for table in HOT_TABLES:
+            cur.execute(f'ANALYZE {table}')
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN-проверки только для PostgreSQL")
+class HotQueryPlanTests(TestCase):
+    """
+    EXPLAIN горячих запросов (views_clients / views_geo / geo_features) на
+    засеянной БД с индексами из core/db_indexes.py. С enable_seqscan = off
+    Seq Scan в плане остаётся только там, где подходящего индекса нет.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_client_tables()
+
+    def assertNoSeqScans(self, queries):
+        statements = [q['sql'] for q in queries
+                      if q['sql'].lstrip().split(None, 1)[0].upper() in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')]
+        self.assertTrue(statements, "запросы не перехвачены")
+        with connection.cursor() as cur:
+            cur.execute('SET LOCAL enable_seqscan = off')
+            for sql in statements:
+                cur.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                tables = seq_scans(plan[0]['Plan'])
+                self.assertFalse(tables, f"Seq Scan по {', '.join(tables)}:\n{sql}")
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cur:
+            for ix in INDEXES:
+                self.assertEqual(state(cur, ix), 'ok', ix.name)
+
+    def test_client_detail(self):
+        dog = Dog.objects.filter(ac_client_hash=CLIENT).first()
+        for period in ('all', '30d'):
+            request = RequestFactory().get(f'/clients/{dog.pk}/', {'period': period})
+            with CaptureQueriesContext(connection) as ctx:
+                response = client_detail_view(request, dog.pk)
+            self.assertEqual(response.status_code, 200)
+            self.assertNoSeqScans(ctx.captured_queries)
+
+    def test_heatmap_single_client(self):
+        request = RequestFactory().get('/api/geo/heatmap/', {'client_id': CLIENT, 'period': 'all'})
+        with CaptureQueriesContext(connection) as ctx:
+            response = HeatmapAPI.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNoSeqScans(ctx.captured_queries)
+
+    def test_homework(self):
+        request = RequestFactory().get('/api/geo/homework/', {'client_id': CLIENT, 'period': 'all'})
+        with CaptureQueriesContext(connection) as ctx:
+            response = HomeWorkAPI.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNoSeqScans(ctx.captured_queries)
+
+    def test_geo_features_events(self):
+        with CaptureQueriesContext(connection) as ctx:
+            list(load_events_qs(str(CLIENT), period='all').values('dt', 'geolatitude', 'geolongitude'))
+        self.assertNoSeqScans(ctx.captured_queries)
+
+    def test_debt_snapshot_incremental_refresh(self):
+        with CaptureQueriesContext(connection) as ctx, connection.cursor() as cur:
+            debt_snapshot.refresh(cur, 'SELECT %s::bigint', [CLIENT])
+        self.assertNoSeqScans(ctx.captured_queries)
+
+
+@skipUnless(connection.vendor == 'postgresql', "сводки client_kpis — SQL PostgreSQL")
+class ClientDetailQueryTests(TestCase):
+    """Карточка клиента укладывается в бюджет запросов, сводки совпадают с засеянными данными."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_client_tables()
+        cls.dog = Dog.objects.filter(ac_client_hash=CLIENT).first()
+
+    def test_query_budget(self):
+        mcc.categories()  # справочник MCC читается раз на процесс
+        for period in ('all', '30d'):
+            request = RequestFactory().get(f'/clients/{self.dog.pk}/', {'period': period})
+            with CaptureQueriesContext(connection) as ctx:
+                response = client_detail_view(request, self.dog.pk)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(ctx.captured_queries), CLIENT_DETAIL_QUERY_BUDGET,
+                                 "\n".join(q['sql'] for q in ctx.captured_queries))
+
+    def test_kpis(self):
+        response = self.client.get(f'/clients/{self.dog.pk}/', {'period': 'all'})
+        ctx = response.context
+        # поступления 100..119, траты 50..69 — по 20 операций
+        self.assertEqual(ctx['inc_total'], Decimal(2190))
+        self.assertEqual(ctx['inc_count'], 20)
+        self.assertEqual(ctx['inc_median'], Decimal(109))
+        self.assertEqual(ctx['inc_top_sources'][0]['amount'], Decimal(2190))
+        self.assertEqual(ctx['spend_total'], Decimal(1190))
+        self.assertEqual(ctx['spend_count'], 20)
+        self.assertEqual(ctx['top_city'], 'Москва')
+        self.assertEqual(ctx['geo_share'], 100.0)
+        self.assertEqual(ctx['atm_sum'], 0)
+        self.assertEqual([(m['ops'], m['share']) for m in ctx['top_merchants']], [(20, 100.0)])
+        # все траты засеяны с MCC 5411 — одна категория из справочника
+        self.assertEqual([(c['code'], c['name'], c['share']) for c in ctx['spend_categories']],
+                         [('grocery', 'продукты', 100.0)])
+        self.assertIsNotNone(ctx['weekday_peak'])
+
+    def test_feed_keyset_pages(self):
+        pages, cursor = [], None
+        while True:
+            rows, cursor, prev = feed_page(CLIENT, size=7, cursor=cursor)
+            pages.append((rows, prev))
+            if not cursor:
+                break
+        feed = [r for rows, _ in pages for r in rows]
+        # 20 поступлений c + 20 списаний tr, новые сверху, без повторов
+        self.assertEqual(len(feed), 40)
+        self.assertEqual([r['date'] for r in feed], sorted((r['date'] for r in feed), reverse=True))
+        self.assertEqual(sum(r['direction'] == 'C' for r in feed), 20)
+        # «назад» со второй страницы — снова первая
+        back, _, _ = feed_page(CLIENT, size=7, cursor=pages[1][1])
+        self.assertEqual(back, pages[0][0])
+        rows, _, _ = feed_page(CLIENT, direction='D', size=100)
+        self.assertEqual({r['direction'] for r in rows}, {'D'})
+        self.assertEqual(rows[0]['merchant_cat'], 'grocery')
+
+    def test_daily_rollups_follow_ingest(self):
+        columns = ['src', 'ac.client_hash', 'c_txn_dt', 'txn_cod_type_rk', 'txn_cod_type_name',
+                   'c_txn_rub_amt', 'day_part']
+        row = ['c', str(CLIENT), datetime(2025, 1, 2, 12, tzinfo=dt_timezone.utc), 1, 'Зачисление',
+               Decimal(500), date(2025, 1, 2)]
+
+        def publish(mode, lo=None, hi=None):
+            stage = Stage('c', 'c', mode, 'day_part', client_daily.after_c_publish)
+            with connection.cursor() as cur:
+                stage.create(cur, columns)
+                cur.execute(f"INSERT INTO {stage.name} VALUES ({', '.join(['%s'] * len(row))})", row)
+            stage.publish(lo, hi)
+
+        def income():
+            return ClientDailyIncome.objects.filter(ac_client_hash=str(CLIENT)).aggregate(
+                total=Sum('inc_sum'), count=Sum('inc_count'))
+
+        # append: агрегат порции прибавляется
+        publish(IngestJob.APPEND)
+        self.assertEqual(income(), {'total': Decimal(2190 + 500), 'count': 21})
+        # replace_range по всем засеянным дням: остаётся только новая строка
+        publish(IngestJob.REPLACE_RANGE, date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(income(), {'total': Decimal(500), 'count': 1})
+
+    def test_so_link_follows_ingest(self):
+        # засеянные so совпадают с c по клиенту, сумме и дню — связано каждое поступление
+        self.assertEqual(SoCLink.objects.filter(ac_client_hash=str(CLIENT)).count(), 20)
+        dt = datetime(2025, 1, 2, 12, tzinfo=dt_timezone.utc)
+
+        # поступление без пары в so — связи нет
+        publish_row('c', so_link.relink_after_c_publish, C_COLUMNS,
+                    ['c', str(CLIENT), dt, 1, 'Зачисление', Decimal(777), dt.date()])
+        c_id = C.objects.get(ac_client_hash=str(CLIENT), c_txn_rub_amt=777).pk
+        self.assertFalse(SoCLink.objects.filter(c_id=c_id).exists())
+        # операция so той же суммы в тот же день — связь появляется после публикации so
+        publish_row('so', so_link.relink_after_so_publish, SO_COLUMNS,
+                    [str(CLIENT), 'e', Decimal(777), 'l', 'o', dt + timedelta(minutes=5), dt.date(), dt,
+                     'платёж', False, dt.date()])
+        link = SoCLink.objects.get(c_id=c_id)
+        self.assertEqual((link.doc_type, link.date_time_oper), ('платёж', dt + timedelta(minutes=5)))
+        self.assertEqual(SoCLink.objects.filter(ac_client_hash=str(CLIENT)).count(), 21)
+
+
+C_COLUMNS = ['src', 'ac.client_hash', 'c_txn_dt', 'txn_cod_type_rk', 'txn_cod_type_name', 'c_txn_rub_amt', 'day_part']
+SO_COLUMNS = ['ac.client_hash', 'erib_id', 'oper_rur_amt', 'login_type', 'oper_type', 'date_time_oper',
+              'date_create', 'date_time_create', 'doc_type', 't.p2p_flg', 'day_part']
+
+
+def publish_row(key, hook, columns, row):
+    """Публикует одну строку в key (append) через stage с хуком hook."""
+    stage = Stage(key, key, IngestJob.APPEND, 'day_part', hook)
+    with connection.cursor() as cur:
+        stage.create(cur, columns)
+        cur.execute(f"INSERT INTO {stage.name} VALUES ({', '.join(['%s'] * len(row))})", row)
+    stage.publish()
+
+
+@skipUnless(connection.vendor == 'postgresql', "очередь загрузок — SELECT ... FOR UPDATE SKIP LOCKED")
+class IngestJobReapTests(TestCase):
+    """Задачи убитых обработчиков не остаются running навсегда."""
+
+    @override_settings(INGEST_JOB_TIMEOUT=3600)
+    def test_reap_stale_jobs(self):
+        # pid только что завершившегося процесса — мёртвый
+        child = subprocess.Popen([sys.executable, '-c', 'pass'])
+        child.wait()
+        now, host = timezone.now(), socket.gethostname()
+
+        def running(pid, host, beat, started=None):
+            return IngestJob.objects.create(status=IngestJob.RUNNING, worker_pid=pid, worker_host=host,
+                                            started_at=started or beat, heartbeat_at=beat)
+
+        dead = running(child.pid, host, now)
+        alive = running(os.getpid(), host, now)
+        other_host = running(child.pid, 'other-host', now)
+        # долгая загрузка, отчитывающаяся о прогрессе, — не зависла
+        long_upload = running(12345, 'other-host', now, started=now - timedelta(hours=5))
+        silent = running(12345, 'other-host', now - timedelta(hours=2))
+
+        self.assertEqual(reap_stale_jobs(), 2)
+        status = dict(IngestJob.objects.values_list('pk', 'status'))
+        self.assertEqual(status[dead.pk], IngestJob.FAILED)
+        self.assertEqual(status[silent.pk], IngestJob.FAILED)
+        self.assertEqual(status[alive.pk], IngestJob.RUNNING)
+        self.assertEqual(status[other_host.pk], IngestJob.RUNNING)
+        self.assertEqual(status[long_upload.pk], IngestJob.RUNNING)
+
+    def test_progress_is_heartbeat(self):
+        job = IngestJob.objects.create(status=IngestJob.RUNNING, heartbeat_at=timezone.now() - timedelta(hours=3))
+        job.update_progress('tr', {'parsed': 10})
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(job.progress, {'tr': {'parsed': 10}})
+
+    @override_settings(INGEST_JOB_TIMEOUT=3600)
+    def test_reaped_job_is_not_resurrected(self):
+        job_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, job_dir, True)
+        with open(os.path.join(job_dir, 'tr.csv'), 'w') as f:
+            f.write('x\n')
+        job = IngestJob.objects.create(status=IngestJob.RUNNING, worker_pid=os.getpid(),
+                                       worker_host='other-host', files={'tr': os.path.join(job_dir, 'tr.csv')},
+                                       heartbeat_at=timezone.now() - timedelta(hours=2))
+
+        def slow_ingest(*args, **kwargs):
+            # пока задача ещё идёт, её помечает failed ingest_worker, запущенный на другом хосте
+            self.assertEqual(reap_stale_jobs(), 1)
+            return ['tr: готово']
+
+        with mock.patch('core.ingest.run_ingest', side_effect=slow_ingest):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestJob.FAILED)
+        self.assertIn('не отвечает', job.error)
+        self.assertEqual(job.messages, [])
+        self.assertTrue(os.path.exists(job_dir))   # файлы остаются для разбора
+
+
+@skipUnless(connection.vendor == 'postgresql', "два соединения и advisory-замок — Postgres")
+class SoLinkConcurrentPublishTests(TransactionTestCase):
+    """Пара c и so, опубликованная одновременно из двух соединений, всё равно связывается."""
+
+    serialized_rollback = True   # справочники из миграций (бакеты, MCC) нужны следующим тестам
+    CLIENT = '7000000000000999001'
+
+    def tearDown(self):
+        C.objects.filter(ac_client_hash=self.CLIENT).delete()
+        So.objects.filter(ac_client_hash=self.CLIENT).delete()
+        super().tearDown()
+
+    def test_pair_published_concurrently(self):
+        dt = datetime(2025, 3, 1, 10, tzinfo=dt_timezone.utc)
+        c_published, so_started = threading.Event(), threading.Event()
+        errors = []
+
+        def in_thread(target):
+            def run():
+                try:
+                    target()
+                except Exception as e:   # ошибку потока увидит assert ниже
+                    errors.append(e)
+                finally:
+                    connection.close()
+            return threading.Thread(target=run)
+
+        def publish_c():
+            # транзакция c остаётся открытой, пока so не начнёт свою публикацию
+            with transaction.atomic():
+                publish_row('c', so_link.relink_after_c_publish, C_COLUMNS,
+                            ['c', self.CLIENT, dt, 1, 'Зачисление', Decimal(321), dt.date()])
+                c_published.set()
+                so_started.wait(10)
+                time.sleep(0.5)
+
+        def publish_so():
+            c_published.wait(10)
+            so_started.set()
+            publish_row('so', so_link.relink_after_so_publish, SO_COLUMNS,
+                        [self.CLIENT, 'e', Decimal(321), 'l', 'o', dt + timedelta(minutes=1), dt.date(), dt,
+                         'платёж', False, dt.date()])
+
+        threads = [in_thread(publish_c), in_thread(publish_so)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+        self.assertEqual(errors, [])
+        c_id = C.objects.get(ac_client_hash=self.CLIENT).pk
+        so_id = So.objects.get(ac_client_hash=self.CLIENT).pk
+        self.assertEqual(list(SoCLink.objects.filter(ac_client_hash=self.CLIENT).values_list('c_id', 'so_id')),
+                         [(c_id, so_id)])
+
+
+class IngestReaderTests(SimpleTestCase):
+    """xlsx и CSV отбрасывают строки с пустой/битой датой одинаково и как прежняя загрузка."""
+
+    HEADER = ('src', 'ac_client_hash', 'c_txn_dt', 'c_txn_rub_amt')
+    # корректная дата, пустая ячейка, мусор
+    ROWS = [
+        ('c', '123', datetime(2025, 1, 2, 10, 0), 100),
+        ('c', '124', None, 200),
+        ('c', '125', 'не дата', 300),
+    ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.xlsx = os.path.join(tmp.name, 'c.xlsx')
+        wb = Workbook()
+        wb.active.append(self.HEADER)
+        for row in self.ROWS:
+            wb.active.append(row)
+        wb.save(self.xlsx)
+        self.csv = os.path.join(tmp.name, 'c.csv')
+        with open(self.csv, 'w', encoding='utf-8') as f:
+            f.write(','.join(self.HEADER) + '\n')
+            for src, client, dt, amt in self.ROWS:
+                dt = dt.strftime('%Y-%m-%d %H:%M:%S') if isinstance(dt, datetime) else (dt or '')
+                f.write(f'{src},{client},{dt},{amt}\n')
+
+    @staticmethod
+    def _normalize(path):
+        frames = [prepare_frame(df) for df in iter_chunks(path)]
+        return DATASETS['c']['normalize'](pd.concat(frames, ignore_index=True))
+
+    def _baseline_bad(self):
+        # прежняя построчная проверка upload_multi_page: pd.read_excel + pd.to_datetime по каждой строке
+        bad = 0
+        for _, row in pd.read_excel(self.xlsx).dropna(how='all').iterrows():
+            raw = row.get('c_txn_dt')
+            parsed = None if raw is None else pd.to_datetime(raw, errors='coerce')
+            if (parsed is None or pd.isna(parsed)) and raw not in (None, '', 'NaT'):
+                bad += 1
+        return bad
+
+    def test_empty_and_bad_dates_rejected(self):
+        xlsx, xlsx_bad = self._normalize(self.xlsx)
+        csv, csv_bad = self._normalize(self.csv)
+        self.assertEqual(self._baseline_bad(), 2)
+        self.assertEqual((xlsx_bad, csv_bad), (2, 2))
+        self.assertEqual(list(xlsx['ac.client_hash']), ['123'])
+        self.assertEqual(list(csv['ac.client_hash']), ['123'])
+        self.assertEqual(list(xlsx['c_txn_dt']), list(csv['c_txn_dt']))
+
+    def test_missing_column_is_not_bad(self):
+        # колонки даты нет вовсе — NULL, а не отброшенные строки (как row.get() раньше)
+        df = pd.DataFrame({'src': ['c', 'c'], 'ac_client_hash': ['1', '2']})
+        out, bad = DATASETS['c']['normalize'](df)
+        self.assertEqual((len(out.index), bad), (2, 0))
+
+
+@skipUnless(connection.vendor == 'postgresql', "NULLS FIRST/LAST ключа — как в Postgres")
+class ClientsKeysetTests(TestCase):
+    """Страницы по ключу: обход вперёд и назад даёт весь список без повторов и пропусков."""
+
+    SIZE = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rows = seed_snapshot()
+
+    def _page(self, ordering, columns, cursor=None, offset=0):
+        rows, next_cursor, prev_cursor = page_clients(
+            filtered_clients(client_filters(QueryDict())), ordering, self.SIZE,
+            cursor=cursor, offset=offset, columns=columns,
+        )
+        ids = [r[0] if columns else r.ac_client_hash for r in rows]
+        return ids, next_cursor, prev_cursor
+
+    def test_walk_forward_and_back(self):
+        for ordering in ORDERINGS:
+            for columns in (None, CLIENT_DEBT_COLUMNS):
+                with self.subTest(ordering=ordering, columns=columns):
+                    expected = expected_order(self.rows, ordering)
+                    seen, cursor, pages = [], None, 0
+                    while True:
+                        ids, cursor, prev_cursor = self._page(ordering, columns, cursor)
+                        self.assertEqual(prev_cursor is None, pages == 0)
+                        seen += ids
+                        pages += 1
+                        if cursor is None:
+                            break
+                    self.assertEqual(seen, expected)
+
+                    back, cursor = ids, prev_cursor
+                    while cursor:
+                        ids, next_cursor, cursor = self._page(ordering, columns, cursor)
+                        self.assertIsNotNone(next_cursor)
+                        back = ids + back
+                    self.assertEqual(back, expected)
+
+    def test_legacy_offset(self):
+        for ordering in ORDERINGS:
+            with self.subTest(ordering=ordering):
+                expected = expected_order(self.rows, ordering)
+                ids, next_cursor, prev_cursor = self._page(ordering, None, offset=8)
+                self.assertEqual(ids, expected[8:12])
+                self.assertEqual(self._page(ordering, None, next_cursor)[0], expected[12:16])
+                self.assertEqual(self._page(ordering, None, prev_cursor)[0], expected[4:8])
+
+    def test_foreign_cursor(self):
+        _, next_cursor, _ = self._page('total_debt', None)
+        with self.assertRaises(InvalidCursor):
+            self._page('-total_debt', None, next_cursor)
+        with self.assertRaises(InvalidCursor):
+            self._page('total_debt', None, 'не-курсор')
+
+
+@skipUnless(connection.vendor == 'postgresql', "оценка строк — EXPLAIN в Postgres")
+@override_settings(CACHES=LOCMEM_CACHE)
+class ClientsCountTests(TestCase):
+    """«Всего»: точное число кэшируется до смены поколения, большие выборки — оценкой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_snapshot()
+
+    def setUp(self):
+        cache.clear()
+
+    def _filters(self, query=''):
+        return client_filters(QueryDict(query))
+
+    def test_exact_and_cached(self):
+        filters = self._filters('debt_min=1000')
+        expected = ClientDebtSnapshot.objects.filter(debt_tot_os_rub_amt__gte=1000).count()
+        self.assertEqual(clients_count(filters, allow_estimate=False), (expected, False))
+        # тот же набор фильтров в другой записи — тот же ключ, COUNT не выполняется
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(clients_count(self._filters('debt_min=1000.00')), (expected, False))
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_generation_invalidates(self):
+        filters = self._filters()
+        self.assertEqual(clients_count(filters, allow_estimate=False).value, 23)
+        ClientDebtSnapshot.objects.filter(ac_client_hash__gte=9_000_000_000_000_020).delete()
+        self.assertEqual(clients_count(filters, allow_estimate=False).value, 23)
+        with connection.cursor() as cur:
+            DataVersion.bump(cur)
+        self.assertEqual(clients_count(filters, allow_estimate=False).value, 20)
+
+    @override_settings(CLIENTS_COUNT_EXACT_LIMIT=-1)
+    def test_estimate_over_limit(self):
+        count = clients_count(self._filters())
+        self.assertTrue(count.approximate)
+        self.assertGreaterEqual(count.value, 0)
+        # оценка не кэшируется и не мешает точному числу для ?page=
+        self.assertEqual(clients_count(self._filters(), allow_estimate=False), (23, False))
+
+
+@skipUnless(connection.vendor == 'postgresql', "NULLS FIRST/LAST сортировки — как в Postgres")
+class ClientsExportTests(TestCase):
+    """Выгрузка идёт в порядке списка, с типами, которые понимают CSV и Excel."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rows = seed_snapshot()
+
+    def test_rows_follow_list_order(self):
+        filters = client_filters(QueryDict('city=Москва'), 'Москва')
+        rows = list(clients_export.export_rows(filters, '-total_debt'))
+        moscow = [r for r in self.rows if r.city == 'Москва']
+        self.assertEqual([r[0] for r in rows], [str(h) for h in expected_order(moscow, '-total_debt')])
+        by_id = {str(r.ac_client_hash): r for r in moscow}
+        for client, debt, bucket, npl, city, day_part in rows:
+            snap = by_id[client]
+            self.assertEqual((debt, bucket, city, day_part),
+                             (snap.debt_tot_os_rub_amt, snap.overdue_bucket_name, 'Москва', date(2025, 1, 1)))
+            self.assertIs(type(npl), int)
+
+    def test_files_follow_order_clients(self):
+        filters = client_filters(QueryDict())
+        for ordering in ORDERINGS:
+            with self.subTest(ordering=ordering):
+                expected = [str(h) for h in order_clients(filtered_clients(filters), ordering)
+                            .values_list('ac_client_hash', flat=True)]
+                text = ''.join(clients_export.iter_csv(clients_export.export_rows(filters, ordering)))
+                self.assertTrue(text.startswith('\ufeff' + ','.join(t for _, t in clients_export.EXPORT_COLUMNS)))
+                self.assertEqual([line.split(',')[0] for line in text[1:].splitlines()[1:]], expected)
+
+                buf = BytesIO()
+                self.assertEqual(clients_export.write_xlsx(clients_export.export_rows(filters, ordering), buf), 23)
+                buf.seek(0)
+                sheet = load_workbook(buf).worksheets[0]
+                self.assertEqual([r[0] for r in sheet.iter_rows(min_row=2, values_only=True)], expected)
+
+
+class ClientsExportFormatTests(SimpleTestCase):
+    ROWS = [
+        ('9000000000000000001', Decimal('2500.25'), '1-30', 1, 'Москва', date(2025, 1, 1)),
+        ('9000000000000000002', None, None, None, None, None),
+        ('9000000000000000003', Decimal('0.25'), '0', 0, 'Казань', date(2025, 1, 2)),
+    ]
+    HEADER = [title for _, title in clients_export.EXPORT_COLUMNS]
+
+    def test_csv(self):
+        text = ''.join(clients_export.iter_csv(iter(self.ROWS)))
+        self.assertTrue(text.startswith('\ufeff'))
+        lines = text[1:].splitlines()
+        self.assertEqual(lines[0], ','.join(self.HEADER))
+        self.assertEqual(lines[1:], [
+            '9000000000000000001,2500.25,1-30,1,Москва,2025-01-01',
+            '9000000000000000002,,,,,',
+            '9000000000000000003,0.25,0,0,Казань,2025-01-02',
+        ])
+
+    def _xlsx(self, rows):
+        buf = BytesIO()
+        total = clients_export.write_xlsx(iter(rows), buf)
+        buf.seek(0)
+        wb = load_workbook(buf)
+        return total, {ws.title: [list(r) for r in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+    def test_xlsx_round_trip(self):
+        total, sheets = self._xlsx(self.ROWS)
+        self.assertEqual(total, 3)
+        self.assertEqual(list(sheets), ['Клиенты 1'])
+        header, first, empty, _ = sheets['Клиенты 1']
+        self.assertEqual(header, self.HEADER)
+        # хэш остаётся текстом — Excel не округлит его до 15 знаков
+        self.assertEqual(first[:4], ['9000000000000000001', 2500.25, '1-30', 1])
+        self.assertEqual(empty, ['9000000000000000002', None, None, None, None, None])
+
+    def test_xlsx_splits_sheets(self):
+        with mock.patch.object(clients_export, 'XLSX_SHEET_ROWS', 2):
+            total, sheets = self._xlsx(self.ROWS)
+        self.assertEqual(total, 3)
+        self.assertEqual({t: len(rows) - 1 for t, rows in sheets.items()}, {'Клиенты 1': 2, 'Клиенты 2': 1})
+        self.assertTrue(all(rows[0] == self.HEADER for rows in sheets.values()))
+
+    def test_xlsx_empty(self):
+        total, sheets = self._xlsx([])
+        self.assertEqual((total, sheets), (0, {'Клиенты 1': [self.HEADER]}))
+
+
+class ClientDebtRowTests(SimpleTestCase):
+    """Быстрый путь ClientsListAPI отдаёт то же, что ClientDebtSerializer."""
+
+    def test_matches_serializer(self):
+        debts = [None, Decimal('1.005'), Decimal('1.125'), Decimal('0.125'), Decimal('-0.125'),
+                 Decimal('2500.25'), Decimal('1E+3'), Decimal('7')]
+        for i, debt in enumerate(debts):
+            snap = ClientDebtSnapshot(
+                ac_client_hash=9_000_000_000_000_000 + i, dog_id=i, debt_tot_os_rub_amt=debt,
+                overdue_bucket_name=None if i % 2 else '1-30', npl_nflag=None if i % 3 else i % 2 == 0,
+            )
+            row = tuple(getattr(snap, c) for c in CLIENT_DEBT_COLUMNS) + (snap.dog_id,)
+            with self.subTest(debt=debt):
+                self.assertEqual(client_debt_row(row), ClientDebtSerializer(snap).data)
+
+
+def expected_facets(rows):
+    """Фасеты, посчитанные в Python по строкам снимка."""
+    def group(key):
+        out = {}
+        for r in rows:
+            clients, debt = out.get(key(r), (0, Decimal(0)))
+            out[key(r)] = (clients + 1, debt + (r.debt_tot_os_rub_amt or 0))
+        return out
+
+    buckets = group(lambda r: (r.overdue_bucket_name is None, r.bucket_rank, r.overdue_bucket_name or '', r.overdue_bucket_name))
+    cities = group(lambda r: (r.city is None, r.city or '', r.city))
+    npl = group(lambda r: (r.npl_nflag is None, bool(r.npl_nflag), r.npl_nflag))
+    bins = group(lambda r: (r.debt_tot_os_rub_amt is None,
+                            0 if r.debt_tot_os_rub_amt is None else bisect_right(DEBT_BIN_EDGES, r.debt_tot_os_rub_amt)))
+
+    def edges(key):
+        none, index = key
+        if none:
+            return None, None
+        return (DEBT_BIN_EDGES[index - 1] if index else None,
+                DEBT_BIN_EDGES[index] if index < len(DEBT_BIN_EDGES) else None)
+
+    item = lambda clients, debt, **fields: {**fields, 'clients': clients, 'debt': debt}
+    return {
+        'total': item(len(rows), sum((r.debt_tot_os_rub_amt or 0 for r in rows), Decimal(0))),
+        'buckets': [item(*v, name=k[-1]) for k, v in sorted(buckets.items())],
+        'cities': [item(*v, name=k[-1]) for k, v in sorted(cities.items())],
+        'npl': [item(*v, value=k[-1]) for k, v in sorted(npl.items())],
+        'debt_bins': [item(*v, **dict(zip(('min', 'max'), edges(k)))) for k, v in sorted(bins.items())],
+    }
+
+
+@skipUnless(connection.vendor == 'postgresql', "GROUPING SETS и width_bucket — Postgres")
+class ClientFacetsTests(TestCase):
+    """Фасеты фильтров совпадают с подсчётом по строкам снимка, включая NULL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rows = seed_snapshot()
+        # долги в разных корзинах, включая отрицательный (переплата) и выше последней границы
+        for i, debt in ((1, '-5'), (2, '10000'), (3, '49999.99'), (6, '7500000')):
+            cls.rows[i].debt_tot_os_rub_amt = Decimal(debt)
+            cls.rows[i].save(update_fields=['debt_tot_os_rub_amt'])
+
+    def test_all_clients(self):
+        facets = client_facets(client_filters(QueryDict()))
+        self.assertEqual(facets, expected_facets(self.rows))
+        self.assertEqual(facets['debt_bins'][-1], {'min': None, 'max': None, 'clients': 5, 'debt': Decimal(0)})
+
+    def test_group_by_snapshot(self):
+        facets = client_facets(client_filters(QueryDict()))
+        for facet, column, key in (('buckets', 'overdue_bucket_name', 'name'), ('cities', 'city', 'name'),
+                                   ('npl', 'npl_nflag', 'value')):
+            with self.subTest(facet=facet):
+                grouped = (ClientDebtSnapshot.objects.values_list(column)
+                           .annotate(n=Count('*'), debt=Sum('debt_tot_os_rub_amt')).order_by())
+                self.assertEqual({(i[key], i['clients'], i['debt']) for i in facets[facet]},
+                                 {(v, n, debt or 0) for v, n, debt in grouped})
+                self.assertEqual(sum(i['clients'] for i in facets[facet]), facets['total']['clients'])
+
+    def test_bins_cover_min_and_max(self):
+        bins = client_facets(client_filters(QueryDict()))['debt_bins']
+        bounds = ClientDebtSnapshot.objects.aggregate(lo=Min('debt_tot_os_rub_amt'), hi=Max('debt_tot_os_rub_amt'))
+        for debt in bounds.values():
+            with self.subTest(debt=debt):
+                hits = [b for b in bins if (b['min'] is not None or b['max'] is not None)
+                        and (b['min'] is None or b['min'] <= debt) and (b['max'] is None or debt < b['max'])]
+                self.assertEqual(len(hits), 1)
+        self.assertEqual((bins[0]['min'], bins[-2]['max']), (None, None))   # ниже 0 и выше последней границы
+        self.assertEqual(sum(b['clients'] for b in bins), 23)
+
+    def test_filtered(self):
+        filters = client_filters(QueryDict('bucket=1-30&bucket=0&debt_min=1'), 'Казань')
+        rows = [r for r in self.rows
+                if r.overdue_bucket_name in ('0', '1-30') and r.city == 'Казань'
+                and r.debt_tot_os_rub_amt is not None and r.debt_tot_os_rub_amt >= 1]
+        self.assertTrue(rows)
+        self.assertEqual(client_facets(filters), expected_facets(rows))
+
+
+@skipUnless(connection.vendor == 'postgresql', "снимок и поколение данных — в Postgres")
+# browsable API ссылается на статику DRF — без манифеста collectstatic
+@override_settings(CACHES=LOCMEM_CACHE, STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ViewCacheTests(TestCase):
+    """cached_view на /api/clients/: HIT/MISS, сброс поколением, отдельные записи для JSON и HTML."""
+
+    JSON = 'application/json'
+    BROWSER = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_snapshot()
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, accept, query=''):
+        return self.client.get(f'/api/clients/{query}', HTTP_ACCEPT=accept)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'other.test'])
+    def test_hit_and_miss(self):
+        first = self._get(self.JSON, '?page_size=5&ordering=total_debt')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        # тот же запрос с другим порядком параметров — та же запись
+        second = self._get(self.JSON, '?ordering=total_debt&page_size=5')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        for header in ('Content-Type', 'Allow'):
+            self.assertEqual(second[header], first[header])
+        self.assertIn('Accept', second['Vary'])
+        self.assertEqual(self._get(self.JSON, '?ordering=-total_debt')['X-Cache'], 'MISS')
+        # хост — в ключе (абсолютные ссылки next/previous), пустые параметры — нет
+        self.assertEqual(self.client.get('/api/clients/?page_size=5&ordering=total_debt&city=',
+                                         HTTP_ACCEPT=self.JSON)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/api/clients/?page_size=5&ordering=total_debt',
+                                         HTTP_ACCEPT=self.JSON, HTTP_HOST='other.test')['X-Cache'], 'MISS')
+        self.assertEqual(view_cache.stats(['api_clients']), {'api_clients': {'hit': 2, 'miss': 3}})
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'other.test'])
+    def test_key_parts(self):
+        rf = RequestFactory()
+        key = lambda path, generation=1, **extra: view_cache.cache_key('api_clients', rf.get(path, **extra), generation)
+        base = key('/api/clients/?b=2&a=1&a=0&c=')
+        self.assertEqual(base, key('/api/clients/?a=0&a=1&b=2'))
+        for other in (key('/clients/table/?a=0&a=1&b=2'), key('/api/clients/?a=0&a=1&b=2', generation=2),
+                      key('/api/clients/?a=0&a=1&b=2', HTTP_HOST='other.test'), key('/api/clients/?a=0&b=2')):
+            self.assertNotEqual(base, other)
+
+    def test_stampede_waits_for_entry(self):
+        request = RequestFactory().get('/api/clients/', HTTP_ACCEPT=self.JSON)
+        key = view_cache.cache_key('api_clients', request, DataVersion.current(), ('Accept',))
+        self.assertTrue(cache.add(f'{key}:lock', 1, view_cache.STAMPEDE_LOCK_TTL))
+        entry = (200, self.JSON, b'{"ready":true}', {'Vary': 'Accept'})
+        # пока этот запрос ждёт, другой (держатель замка) кладёт готовый ответ
+        with mock.patch.object(view_cache.time, 'sleep', side_effect=lambda _: cache.set(key, entry)):
+            response = self._get(self.JSON)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.content, b'{"ready":true}')
+        self.assertEqual(response['Vary'], 'Accept')
+
+    def test_generation_invalidates(self):
+        self.assertEqual(self._get(self.JSON)['X-Cache'], 'MISS')
+        self.assertEqual(self._get(self.JSON)['X-Cache'], 'HIT')
+        with connection.cursor() as cur:
+            DataVersion.bump(cur)
+        self.assertEqual(self._get(self.JSON)['X-Cache'], 'MISS')
+
+    def test_accept_negotiation(self):
+        html = self._get(self.BROWSER)
+        self.assertEqual(html['X-Cache'], 'MISS')
+        self.assertTrue(html['Content-Type'].startswith('text/html'))
+
+        api = self._get(self.JSON)
+        self.assertEqual(api['X-Cache'], 'MISS')
+        self.assertTrue(api['Content-Type'].startswith(self.JSON))
+        self.assertEqual(len(json.loads(api.content)['results']), 23)
+
+        for accept, content_type in ((self.BROWSER, 'text/html'), (self.JSON, self.JSON)):
+            again = self._get(accept)
+            self.assertEqual(again['X-Cache'], 'HIT')
+            self.assertTrue(again['Content-Type'].startswith(content_type))
+            self.assertIn('Accept', again['Vary'])
+        self.assertEqual(self._get(self.BROWSER, '?format=json')['Content-Type'], api['Content-Type'])
+
+
+@skipUnless(connection.vendor == 'postgresql', "снимок и оценка строк — Postgres")
+@override_settings(CACHES=LOCMEM_CACHE)
+class ClientsListAPITests(TestCase):
+    """Форма ответа /api/clients/: count и approximate в каждом ответе, next/previous — курсоры."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_snapshot()
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, query=''):
+        return json.loads(self.client.get(f'/api/clients/{query}', HTTP_ACCEPT='application/json').content)
+
+    def test_count_on_cursor_pages(self):
+        first = self._get('?page_size=10&city=Москва')
+        self.assertEqual((first['count'], first['approximate']), (8, False))
+        self.assertEqual(len(first['results']), 8)
+        self.assertIsNone(first['next'])
+
+        page = self._get('?page_size=10')
+        self.assertEqual((page['count'], page['approximate'], page['previous']), (23, False, None))
+        self.assertIn('cursor=', page['next'])
+        second = self.client.get(page['next'], HTTP_ACCEPT='application/json').json()
+        self.assertEqual(second['count'], 23)
+        self.assertIn('cursor=', second['previous'])
+
+    @override_settings(CLIENTS_COUNT_EXACT_LIMIT=-1)
+    def test_estimate_and_legacy_page(self):
+        self.assertTrue(self._get()['approximate'])
+        # ?page= — номер страницы считают от count, поэтому он точный
+        page = self._get('?page=2&page_size=10')
+        self.assertEqual((page['count'], page['approximate'], len(page['results'])), (23, False, 10))
+        self.assertNotIn('page=', page['next'])
+
+
+@skipUnless(connection.vendor == 'postgresql', "снимок, фасеты и оценка строк — Postgres")
+@override_settings(CACHES=LOCMEM_CACHE)
+class ClientsCityFilterTests(TestCase):
+    """Таблица, фасеты, выгрузка и API по одной строке запроса видят один и тот же город."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_snapshot()
+
+    def setUp(self):
+        cache.clear()
+
+    def _counts(self, city):
+        table = self.client.get('/clients/table/', {'city': city, 'page_size': 100})
+        facets = self.client.get('/clients/facets/', {'city': city}).json()
+        export = b''.join(self.client.get('/clients/export/', {'city': city}).streaming_content)
+        api = self.client.get('/api/clients/', {'city': city, 'page_size': 100}, HTTP_ACCEPT='application/json')
+        return (len(table.context['results']), facets['total']['clients'],
+                len(export.decode('utf-8-sig').splitlines()) - 1, api.json()['count'])
+
+    def test_known_city(self):
+        self.assertEqual(self._counts('Казань'), (8, 8, 8, 8))
+
+    def test_unknown_city_is_ignored(self):
+        for city in ('Нигде', ' ', ''):
+            with self.subTest(city=city):
+                self.assertEqual(self._counts(city), (23, 23, 23, 23))
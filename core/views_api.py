@@ -1,46 +1,93 @@
-from django.db.models import F
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import ListAPIView
-from rest_framework.pagination import PageNumberPagination
-from core.models import Dog
-from .serializers import ClientDebtSerializer
+from rest_framework.pagination import BasePagination
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from core.cities import selected_city
+from core.clients_count import clients_count
+from core.clients_query import (
+    InvalidCursor, client_filters, filtered_clients, ordering_or_default, page_clients,
+)
+from .renderers import FastJSONRenderer
+from .serializers import CLIENT_DEBT_COLUMNS, ClientDebtSerializer, client_debt_row
 
-class ClientPagination(PageNumberPagination):
+class ClientPagination(BasePagination):
+    """
+    Курсорные страницы по (поле сортировки, dog_id): ?cursor= из next/previous.
+    ?page= работает как раньше (смещение), ссылки — уже курсоры.
+    count — в каждом ответе (clients_count): на больших выборках — оценка,
+    тогда approximate = true; для ?page= — всегда точное число.
+    """
     page_size = 50
     page_size_query_param = 'page_size'
     max_page_size = 200
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        params = request.query_params
+        ordering = ordering_or_default(params.get('ordering'), default=getattr(view, 'default_ordering', '-total_debt'))
+        size = self.get_page_size(request)
+        offset = 0
+        if 'page' in params:
+            try:
+                offset = (max(int(params['page']), 1) - 1) * size
+            except (TypeError, ValueError):
+                offset = 0
+        self.count = clients_count(view.filters, allow_estimate='page' not in params)
+        try:
+            rows, self.next_cursor, self.prev_cursor = page_clients(
+                queryset, ordering, size, cursor=params.get(self.cursor_query_param), offset=offset,
+                columns=getattr(view, 'columns', None),
+            )
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return rows
+
+    def _link(self, cursor):
+        if not cursor:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count.value,
+            'approximate': self.count.approximate,
+            'next': self._link(self.next_cursor),
+            'previous': self._link(self.prev_cursor),
+            'results': data,
+        })
 
 class ClientsListAPI(ListAPIView):
+    """
+    Список клиентов. Чтение — кортежами values_list (columns) и готовым
+    отображением строки в dict (client_debt_row) вместо ClientDebtSerializer:
+    форма ответа та же, без построения моделей и сериализации по полям.
+    Сравнение: python manage.py bench_clients_api.
+    """
     serializer_class = ClientDebtSerializer
     pagination_class = ClientPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    default_ordering = '-total_debt'
+    columns = CLIENT_DEBT_COLUMNS
 
     def get_queryset(self):
-        qs = Dog.objects.all().only(
-            'id', 'ac_client_hash', 'debt_tot_os_rub_amt', 'overdue_bucket_name', 'npl_nflag'
-        )
-
-        # фильтр по сумме
-        debt_min = self.request.query_params.get('debt_min')
-        debt_max = self.request.query_params.get('debt_max')
-        if debt_min not in (None, ''):
-            qs = qs.filter(debt_tot_os_rub_amt__gte=debt_min)
-        if debt_max not in (None, ''):
-            qs = qs.filter(debt_tot_os_rub_amt__lte=debt_max)
-
-        # фильтр по бакетам
-        buckets = self.request.query_params.getlist('bucket')
-        if buckets:
-            qs = qs.filter(overdue_bucket_name__in=buckets)
-
-        # DISTINCT ON: одна запись на клиента с макс. долгом
-        qs = qs.order_by('ac_client_hash', '-debt_tot_os_rub_amt', 'id').distinct('ac_client_hash')
-
-        # итоговая сортировка для пользователя
-        ordering = self.request.query_params.get('ordering', '-total_debt')
-        ordering_map = {
-            'total_debt': 'debt_tot_os_rub_amt',
-            '-total_debt': '-debt_tot_os_rub_amt',
-        }
-        qs = qs.order_by(ordering_map.get(ordering, '-debt_tot_os_rub_amt'))
-
-        return qs
+        # одна запись на клиента (с макс. долгом) — из снимка client_debt_snapshot;
+        # сортировку и страницы задаёт ClientPagination
+        params = self.request.query_params
+        self.filters = client_filters(params, city=selected_city(params.get('city')))
+        return filtered_clients(self.filters)
+
+    def list(self, request, *args, **kwargs):
+        rows = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response([client_debt_row(r) for r in rows])
 
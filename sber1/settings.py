@@ -100,6 +100,48 @@ DATABASES["default"]["OPTIONS"]["options"] = "-c search_path=cber_schema,public"
 
 
 
+# -------- Ingestion --------
+# Размер порции строк при потоковой загрузке файлов (каждая порция — своя транзакция)
+INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", "50000"))
+# Сколько датасетов одной загрузки обрабатывать параллельно (процессы, по соединению с БД на каждый)
+INGEST_PARALLEL = int(os.environ.get("INGEST_PARALLEL", "5"))
+# Задача running без отметок прогресса дольше стольких секунд считается зависшей (ingest_worker при старте -> failed)
+INGEST_JOB_TIMEOUT = int(os.environ.get("INGEST_JOB_TIMEOUT", "3600"))
+
+# -------- Cache --------
+# Кэш ответов (core/cache.py) и счётчиков списков. locmem — в памяти процесса;
+# file — общий для всех воркеров gunicorn каталог (CACHE_DIR).
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem").lower()
+if CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_DIR", str(BASE_DIR / ".cache")),
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "sber1",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+# TTL ответов по имени view (данные меняются только загрузкой — ключ сбрасывается и раньше)
+VIEW_CACHE_TTL = {
+    "clients_table": 300,
+    "clients_buckets": 3600,
+    "clients_facets": 300,
+    "api_clients": 300,
+}
+
+# -------- Clients list --------
+# Точный COUNT для «Всего» — только если по оценке планировщика строк не больше, иначе «≈ оценка»
+CLIENTS_COUNT_EXACT_LIMIT = int(os.environ.get("CLIENTS_COUNT_EXACT_LIMIT", "200000"))
+# Сколько держать точный счётчик в кэше (сбрасывается и раньше — новой загрузкой)
+CLIENTS_COUNT_CACHE_TTL = int(os.environ.get("CLIENTS_COUNT_CACHE_TTL", "86400"))
+
 # -------- Password validators --------
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -4,10 +4,13 @@ from django.urls import path
 from django.conf.urls.static import static
 
 from core import views
+from core.cache import cached_view
 from core.views_api import ClientsListAPI
 from core.views_clients import (
     clients_table_view,
+    clients_export_view,
     buckets_list_api,
+    clients_facets_api,
     client_detail_view,
     client_heatmap_view,
 )
@@ -23,6 +26,7 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('clients/', views.clients_page, name='clients'),
     path('upload/multi/', views.upload_multi_page, name='upload_multi'),
+    path('upload/jobs/<int:job_id>/', views.upload_job_status, name='upload_job_status'),
 
     # Download templates
     path('download/template/cs/', views.download_template_cs, name='download-template-cs'),
@@ -31,16 +35,20 @@ urlpatterns = [
     path('download/template/so/', views.download_template_so, name='download-template-so'),
     path('download/template/dog/', views.download_template_dog, name='download-template-dog'),
 
-    # Clients list + data
-    path('clients/table/', clients_table_view, name='clients_table'),
-    path('clients/buckets/', buckets_list_api, name='clients_buckets'),
+    # Clients list + data (ответы кэшируются до следующей загрузки, core/cache.py)
+    path('clients/table/', cached_view('clients_table')(clients_table_view), name='clients_table'),
+    path('clients/export/', clients_export_view, name='clients_export'),
+    path('clients/buckets/', cached_view('clients_buckets')(buckets_list_api), name='clients_buckets'),
+    path('clients/facets/', cached_view('clients_facets')(clients_facets_api), name='clients_facets'),
 
     # Client detail and heatmap (фикс путей)
     path('clients/<int:pk>/', client_detail_view, name='client-detail'),
     path('clients/<int:pk>/heatmap/', client_heatmap_view, name='client-heatmap'),
 
     # APIs
-    path('api/clients/', ClientsListAPI.as_view(), name='api_clients'),
+    # JSON или browsable HTML — по Accept (?format= уже в ключе)
+    path('api/clients/', cached_view('api_clients', vary=('Accept',))(ClientsListAPI.as_view()),
+         name='api_clients'),
     path('api/geo/heatmap/', HeatmapAPI.as_view(), name='geo-heatmap'),
     path('api/geo/homework/', HomeWorkAPI.as_view(), name='geo-homework'),
 